@@ -0,0 +1,434 @@
+#!/usr/bin/env python
+"""Benchmark the injection hot paths of jeni, with machine-readable results.
+
+Run all benchmarks, or those matching a substring, and write JSON results::
+
+    python bin/benchmark.py --json before.json
+    python bin/benchmark.py apply partial
+
+Compare two runs, exiting non-zero if any benchmark is slower by more than
+the tolerance, for use as a regression gate::
+
+    python bin/benchmark.py --compare before.json after.json --tolerance 0.1
+
+Each result has `ops_per_sec` (best of repeated runs), `blocks_per_op` (net
+memory blocks still allocated per op, Python 3.4+) and `peak_bytes` (peak
+memory allocated during a single op, Python 3.4+).
+
+Benchmark `import` measures ``import jeni`` in a fresh interpreter, with
+bytecode cached: `import_seconds` (best of repeated runs), `import_bytes`
+(memory allocated by the import, Python 3.4+) and `modules` (number of
+modules newly imported).
+
+Benchmark `footprint` measures memory held per injector, Python 3.4+:
+`idle_bytes` for a new injector, and `request_bytes` for an injector which
+applied a typical handler and was closed, as a request injector would.
+"""
+
+from __future__ import print_function
+
+import argparse
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import jeni
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+
+timer = getattr(time, 'perf_counter', time.time)
+
+
+class Injector(jeni.Injector):
+    "Registry of benchmark providers."
+
+
+@Injector.provider('hello')
+class HelloProvider(jeni.Provider):
+    def get(self, name=None):
+        if name is None:
+            name = 'world'
+        return 'Hello, {}!'.format(name)
+
+
+@Injector.provider('answer')
+def answer():
+    yield 42
+
+
+@Injector.factory('eggs')
+def eggs():
+    return 'eggs!'
+
+
+@Injector.factory('echo')
+def echo(name=None):
+    return name
+
+
+DEPTH = 20
+WIDTH = 50
+
+Injector.value('chain0', 0)
+for n in range(1, DEPTH):
+    Injector.factory('chain{}'.format(n),
+                     jeni.annotate('chain{}'.format(n - 1))(lambda x: x + 1))
+
+WIDE = ['wide{}'.format(n) for n in range(WIDTH)]
+for note in WIDE:
+    Injector.value(note, note)
+
+
+@Injector.factory('wide')
+@jeni.annotate(*WIDE)
+def wide(*deps):
+    return deps
+
+
+Hierarchy = Injector
+for n in range(DEPTH):
+    Hierarchy = type('Hierarchy{}'.format(n), (Hierarchy,), {})
+
+
+@jeni.annotate('hello', 'eggs', answer='answer')
+def handler(hello, eggs, answer):
+    return hello, eggs, answer
+
+
+def bench_apply():
+    injector = Injector()
+    return lambda: injector.apply(handler)
+
+
+def bench_compiled_apply():
+    return Injector().compile(handler)
+
+
+def bench_partial_first():
+    injector = Injector()
+    return lambda: injector.partial(handler)()
+
+
+def bench_partial_repeat():
+    fn = Injector().partial(handler)
+    return fn
+
+
+def bench_eager_partial():
+    injector = Injector()
+    return lambda: injector.eager_partial(handler)()
+
+
+def bench_get_hit():
+    injector = Injector()
+    injector.get('eggs')
+    return lambda: injector.get('eggs')
+
+
+def bench_get_miss():
+    injector = Injector()
+    values, get = injector.values, injector.get
+
+    def op():
+        values.clear()
+        return get('eggs')
+    return op
+
+
+def bench_get_named():
+    injector = Injector()
+    return lambda: injector.get('hello:name')
+
+
+def bench_generator_provider():
+    def op():
+        injector = Injector()
+        injector.get('answer')
+        injector.close()
+    return op
+
+
+def bench_class_provider():
+    def op():
+        injector = Injector()
+        injector.get('hello')
+        injector.close()
+    return op
+
+
+def bench_deep_graph():
+    top = 'chain{}'.format(DEPTH - 1)
+    return lambda: Injector().get(top)
+
+
+def bench_wide_graph():
+    return lambda: Injector().get('wide')
+
+
+def bench_deep_hierarchy():
+    return lambda: Hierarchy().get('eggs')
+
+
+def bench_construct_close():
+    def op():
+        Injector().close()
+    return op
+
+
+BENCHMARKS = [
+    (name[len('bench_'):], fn) for name, fn in sorted(globals().items())
+    if name.startswith('bench_')]
+
+
+def measure(setup, min_time=0.2, repeat=3):
+    """Measure op returned by setup, returning result dict."""
+    op = setup()
+    # Find number of iterations which takes at least min_time.
+    number = 1
+    while True:
+        elapsed = run(op, number)
+        if elapsed >= min_time:
+            break
+        number *= 2 if elapsed <= 0 else max(2, int(min_time / elapsed))
+    best = min([elapsed] + [run(op, number) for _ in range(repeat - 1)])
+    result = {'ops_per_sec': number / best, 'iterations': number}
+    result.update(allocations(setup))
+    return result
+
+
+def run(op, number):
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        start = timer()
+        for _ in range(number):
+            op()
+        return timer() - start
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+
+def allocations(setup, number=1000):
+    """Measure memory blocks retained per op and peak bytes of one op."""
+    if tracemalloc is None or not hasattr(sys, 'getallocatedblocks'):
+        return {'blocks_per_op': None, 'peak_bytes': None}
+    op = setup()
+    op()
+    gc.collect()
+    before = sys.getallocatedblocks()
+    for _ in range(number):
+        op()
+    gc.collect()
+    blocks = (sys.getallocatedblocks() - before) / float(number)
+    tracemalloc.start()
+    try:
+        baseline = tracemalloc.get_traced_memory()[0]
+        op()
+        peak = tracemalloc.get_traced_memory()[1] - baseline
+    finally:
+        tracemalloc.stop()
+    return {'blocks_per_op': blocks, 'peak_bytes': peak}
+
+
+def request_injector():
+    injector = Injector()
+    injector.apply(handler)
+    injector.close()
+    return injector
+
+
+def footprint(number=1000):
+    """Measure bytes held per idle injector and per request injector."""
+    if tracemalloc is None:
+        return {'idle_bytes': None, 'request_bytes': None}
+    return {
+        'idle_bytes': retained(Injector, number),
+        'request_bytes': retained(request_injector, number),
+    }
+
+
+def retained(create, number):
+    """Measure bytes held per object, keeping `number` objects created."""
+    create()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        baseline = tracemalloc.get_traced_memory()[0]
+        objects = [create() for _ in range(number)]
+        size = tracemalloc.get_traced_memory()[0] - baseline
+        return (size - sys.getsizeof(objects)) / float(number)
+    finally:
+        tracemalloc.stop()
+
+
+STARTUP = """
+import json, sys, time
+sys.path.insert(0, sys.argv[1])
+trace = sys.argv[2] == 'trace'
+if trace:
+    import tracemalloc
+    tracemalloc.start()
+timer = getattr(time, 'perf_counter', time.time)
+modules = len(sys.modules)
+start = timer()
+import jeni
+seconds = timer() - start
+result = {'seconds': seconds, 'modules': len(sys.modules) - modules}
+if trace:
+    result['bytes'] = tracemalloc.get_traced_memory()[0]
+print(json.dumps(result))
+"""
+
+
+def startup(repeat=10):
+    """Measure import of jeni in fresh interpreters, returning result dict."""
+    env = dict(os.environ)
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+
+    def run_startup(mode):
+        output = subprocess.check_output(
+            [sys.executable, '-c', STARTUP, ROOT, mode], env=env)
+        return json.loads(output.decode('utf-8'))
+
+    run_startup('time') # Cache bytecode.
+    runs = [run_startup('time') for _ in range(repeat)]
+    result = {
+        'import_seconds': min(run['seconds'] for run in runs),
+        'modules': runs[0]['modules'],
+        'import_bytes': None,
+    }
+    if tracemalloc is not None:
+        result['import_bytes'] = run_startup('trace')['bytes']
+    return result
+
+
+def benchmark(names=(), min_time=0.2, repeat=3):
+    results = {}
+    for name, setup in BENCHMARKS:
+        if names and not any(n in name for n in names):
+            continue
+        results[name] = measure(setup, min_time=min_time, repeat=repeat)
+        print_result(name, results[name])
+    if not names or any(n in 'footprint' for n in names):
+        results['footprint'] = footprint()
+        print_footprint(results['footprint'])
+    if not names or any(n in 'import' for n in names):
+        results['import'] = startup()
+        print_startup(results['import'])
+    return {
+        'jeni': jeni.__version__,
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'results': results,
+    }
+
+
+def print_result(name, result):
+    blocks = result['blocks_per_op']
+    print('{:<20} {:>14,.0f} ops/sec {:>10} blocks/op {:>8} peak bytes'.format(
+        name, result['ops_per_sec'],
+        '-' if blocks is None else '{:.2f}'.format(blocks),
+        '-' if result['peak_bytes'] is None else result['peak_bytes']),
+        file=sys.stderr)
+
+
+def print_startup(result):
+    print('{:<20} {:>14.2f} ms {:>10} modules {:>8} bytes'.format(
+        'import', result['import_seconds'] * 1000, result['modules'],
+        '-' if result['import_bytes'] is None else result['import_bytes']),
+        file=sys.stderr)
+
+
+def print_footprint(result):
+    print('{:<20} {:>14} idle bytes {:>8} request bytes'.format(
+        'footprint',
+        '-' if result['idle_bytes'] is None else int(result['idle_bytes']),
+        '-' if result['request_bytes'] is None else int(result['request_bytes'])),
+        file=sys.stderr)
+
+
+#: Metric compared per result, each (key, higher is better, format).
+METRICS = [
+    ('ops_per_sec', True, '{:>14,.0f}'),
+    ('import_seconds', False, '{:>14.6f}'),
+    ('request_bytes', False, '{:>14,.0f}'),
+]
+
+
+def compare(before, after, tolerance=0.1):
+    """Print comparison of two runs, returning names which regressed."""
+    regressed = []
+    print('{:<20} {:>14} {:>14} {:>8}'.format(
+        'benchmark', 'before', 'after', 'change'))
+    for name in sorted(set(before['results']) | set(after['results'])):
+        if name not in before['results'] or name not in after['results']:
+            print('{:<20} {:>14}'.format(name, 'missing'))
+            continue
+        for key, higher, number in METRICS:
+            if key in before['results'][name]:
+                break
+        old = before['results'][name][key]
+        new = after['results'][name].get(key)
+        if not old or not new:
+            print('{:<20} {:>14}'.format(name, 'unmeasured'))
+            continue
+        # Change as improvement, positive when better.
+        change = new / old - 1 if higher else old / new - 1
+        flag = ''
+        if change < -tolerance:
+            regressed.append(name)
+            flag = ' REGRESSION'
+        print(('{:<20} ' + number + ' ' + number + ' {:>+7.1%}{}').format(
+            name, old, new, change, flag))
+    return regressed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('names', nargs='*',
+                        help='run benchmarks whose name contains any of these')
+    parser.add_argument('--json', metavar='FILE',
+                        help='write results as JSON to FILE, - for stdout')
+    parser.add_argument('--min-time', type=float, default=0.2,
+                        help='minimum seconds per timed run')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='timed runs per benchmark, best is kept')
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'),
+                        help='compare two JSON result files')
+    parser.add_argument('--tolerance', type=float, default=0.1,
+                        help='allowed slowdown as a fraction, with --compare')
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        runs = []
+        for filename in args.compare:
+            with open(filename) as fd:
+                runs.append(json.load(fd))
+        regressed = compare(runs[0], runs[1], tolerance=args.tolerance)
+        return 1 if regressed else 0
+
+    results = benchmark(args.names, min_time=args.min_time,
+                        repeat=args.repeat)
+    if args.json == '-':
+        json.dump(results, sys.stdout, indent=2, sort_keys=True)
+        print()
+    elif args.json:
+        with open(args.json, 'w') as fd:
+            json.dump(results, fd, indent=2, sort_keys=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
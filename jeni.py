@@ -6,22 +6,85 @@
 
 __version__ = '0.3.7-dev'
 
+# Keep imports light for fast startup; modules which are slow to import,
+# e.g. inspect and re, are imported where needed, off the hot path.
 import abc
+import bisect
 import collections
+import contextlib
 import functools
-import inspect
-import re
+import gc
+import itertools
+import os
 import sys
-
-import six
+import threading
+import time
+import types
+import weakref
 
 
+PLAIN = 'plain'
 MAYBE = 'maybe'
 PARTIAL = 'partial'
 PARTIAL_REGARDLESS = 'partial_regardless'
 EAGER_PARTIAL = 'eager_partial'
 EAGER_PARTIAL_REGARDLESS = 'eager_partial_regardless'
+PARTIAL_KINDS = (
+    PARTIAL, PARTIAL_REGARDLESS, EAGER_PARTIAL, EAGER_PARTIAL_REGARDLESS)
 WRAPPER_ASSIGNMENTS = functools.WRAPPER_ASSIGNMENTS + ('__notes__',)
+CLASS = 'class'
+GENERATOR = 'generator'
+FACTORY = 'factory'
+INSTANTIATE = 'instantiate'
+INIT = 'init'
+GET = 'get'
+GET_NAME = 'get_name'
+SINGLETON = 'singleton'
+SCOPED = 'scoped'
+TRANSIENT = 'transient'
+PER_NAME = 'per_name'
+LIFETIMES = (SINGLETON, SCOPED, TRANSIENT, PER_NAME)
+
+# Types of classes, including old-style classes on Python 2.
+CLASS_TYPES = (type, getattr(types, 'ClassType', type))
+
+# Code flags, as in the inspect module.
+CO_OPTIMIZED = 0x1
+CO_GENERATOR = 0x20
+
+if sys.version_info[0] >= 3:
+    def reraise(tp, value, tb=None):
+        """Raise value with traceback, as ``six.reraise``."""
+        if value.__traceback__ is not tb:
+            raise value.with_traceback(tb)
+        raise value
+else: # pragma: no cover
+    exec('def reraise(tp, value, tb=None):\n    raise tp, value, tb\n')
+
+# Sentinel for cache misses, as None is a valid value.
+MISSING = object()
+
+# Use the highest resolution clock available, falling back for Python 2.
+timer = getattr(time, 'perf_counter', time.time)
+
+# Insertion-ordered dict which supports reversed; plain dict is smaller.
+ordered_dict = dict if sys.version_info >= (3, 8) else collections.OrderedDict
+
+# Read-only empty mapping, shared as placeholder until a container is needed.
+EMPTY_MAPPING = getattr(types, 'MappingProxyType', dict)({})
+
+# Guards creation of the singleton containers and locks of injector classes.
+singleton_lock = threading.Lock()
+
+
+def reinit_singleton_lock():
+    """Replace `singleton_lock` in a forked child, as it may have been held."""
+    global singleton_lock
+    singleton_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=reinit_singleton_lock)
 
 
 
@@ -39,8 +102,31 @@ class DependencyCycleError(LookupError):
         super(DependencyCycleError, self).__init__(*a, **kw)
 
 
-@six.add_metaclass(abc.ABCMeta)
-class Provider(object):
+class WarmupError(Exception):
+    """Providers failed to warm up, see `Injector.warmup`."""
+    def __init__(self, *a, **kw):
+        #: Errors by basenote, in the order raised.
+        self.errors = kw.pop('errors', None)
+        super(WarmupError, self).__init__(*a, **kw)
+
+
+class CloseError(Exception):
+    """Providers failed to close, see `Injector.close`."""
+    def __init__(self, *a, **kw):
+        #: Errors by basenote, in the order raised.
+        self.errors = kw.pop('errors', None)
+        super(CloseError, self).__init__(*a, **kw)
+
+
+class CloseTimeoutError(RuntimeError):
+    """Provider did not close in time, see `Injector.close`."""
+
+
+# Base class with abstract method support on both Python 2 and Python 3.
+AbstractBase = abc.ABCMeta('AbstractBase', (object,), {})
+
+
+class Provider(AbstractBase):
     """Provide a single prepared dependency."""
 
     @abc.abstractmethod
@@ -55,6 +141,15 @@ class Provider(object):
         key-value store).
         """
 
+    def get_many(self, names):
+        """By default, calls `get` per name. Override to get in bulk.
+
+        Returns a sequence of values in the order of the given names. When a
+        callable is injected with several notes ``'object:name'`` of the
+        same object, the injector asks for all of their names in one call.
+        """
+        return [self.get(name=name) for name in names]
+
     def close(self):
         """By default, does nothing. Close objects as needed in subclass.
 
@@ -69,6 +164,27 @@ class Provider(object):
         method, annotate ``__init__`` and access the value via `self`.
         """
 
+    def after_fork(self):
+        """By default, does nothing. Rebuild state lost on fork in subclass.
+
+        Called by `Injector.after_fork` in a child process on a provider
+        instance built in the parent, e.g. to open a new connection in place
+        of one shared with the parent. The provider instance is kept; when
+        this method is implemented, `get` is called again for a fresh value,
+        and values which depend on it are provided again::
+
+            class DatabaseProvider(Provider):
+                def __init__(self):
+                    self.settings = load_settings() # Built once, shared.
+                    self.connection = connect(self.settings)
+
+                def after_fork(self):
+                    self.connection = connect(self.settings)
+
+        Providers which cannot rebuild their state, e.g. generators, are
+        registered with ``fork_safe=False`` instead, see `Injector.provider`.
+        """
+
 
 class GeneratorProvider(Provider):
     """Manage generator lifecycle to implement Provider interface.
@@ -86,7 +202,7 @@ class GeneratorProvider(Provider):
 
     def __init__(self, function, support_name=False):
         """Accept generator function & whether generator supports send."""
-        if not inspect.isgeneratorfunction(function):
+        if not isgeneratorfunction(function):
             msg = '{!r} is not a generator function'
             raise TypeError(msg.format(function))
         self.function = function
@@ -137,6 +253,122 @@ class GeneratorProvider(Provider):
             raise RuntimeError(msg.format(self.function))
 
 
+class LazyPattern(object):
+    """Regular expression attribute, compiled on first access."""
+
+    def __init__(self, pattern):
+        self.pattern = pattern
+        self.compiled = None
+
+    def __get__(self, obj, objtype=None):
+        if self.compiled is None:
+            import re
+            self.compiled = re.compile(self.pattern)
+        return self.compiled
+
+
+class Note(object):
+    """Immutable, parsed form of an annotation note.
+
+    A note such as ``'object:name'`` is parsed once into its `basenote`
+    ('object'), `name` ('name') and `kind`, one of `PLAIN`, `MAYBE` or the
+    partial kinds. Use `Note.of` to get the interned note for a given raw
+    note, such that parsing happens once per distinct note::
+
+        note = Note.of('hello:world')
+        note.basenote, note.name # ('hello', 'world')
+
+    Notes compare and hash equal to their raw note, so either can be used as
+    a key (e.g. in `Injector.stats`).
+    """
+
+    __slots__ = ('note', 'basenote', 'name', 'kind', 'key', 'inner', 'hash')
+
+    #: Interned notes, raw note -> Note, see `of`.
+    cache = {}
+
+    #: Number of interned notes at which the cache is cleared. This bounds
+    #: the cache when notes have high cardinality, e.g. 'object:name'.
+    cache_size = 4096
+
+    def __init__(self, note):
+        """Parse raw note; prefer `Note.of` to reuse interned notes."""
+        basenote, name, kind, inner = note, None, PLAIN, None
+        if isinstance(note, tuple):
+            if len(note) != 2:
+                raise ValueError('tuple annotations must be length 2')
+            if note[0] == MAYBE:
+                kind, inner = MAYBE, Note.of(note[1])
+                basenote, name = inner.basenote, inner.name
+            elif note[0] in PARTIAL_KINDS:
+                # inner is (function, args, keyword items).
+                kind, inner = note[0], note[1]
+                basenote = None
+            else:
+                basenote, name = note
+        else:
+            # Annotation is 'object:name'.
+            try:
+                parts = note.partition(':')
+            except (AttributeError, TypeError):
+                # Note is not a string. Support any Python object as a note.
+                pass
+            else:
+                basenote = parts[0]
+                if parts[1]:
+                    name = parts[2]
+        try:
+            hash_value = hash(note)
+        except TypeError:
+            hash_value = None
+        setattr = super(Note, self).__setattr__
+        setattr('note', note)
+        setattr('basenote', basenote)
+        setattr('name', name)
+        setattr('kind', kind)
+        setattr('key', (basenote, name))
+        setattr('inner', inner)
+        setattr('hash', hash_value)
+
+    @classmethod
+    def of(cls, note):
+        """Get interned Note of raw note, parsing it only if not yet seen."""
+        if isinstance(note, Note):
+            return note
+        cache = cls.cache
+        try:
+            return cache[note]
+        except KeyError:
+            pass
+        except TypeError:
+            # Unhashable note, which cannot be interned.
+            return cls(note)
+        parsed = cls(note)
+        if len(cache) >= cls.cache_size:
+            cache.clear()
+        cache[note] = parsed
+        return parsed
+
+    def __setattr__(self, name, value):
+        raise AttributeError('{!r} is immutable'.format(self))
+
+    def __eq__(self, other):
+        if isinstance(other, Note):
+            other = other.note
+        return self.note == other
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        if self.hash is None:
+            raise TypeError('unhashable note: {!r}'.format(self.note))
+        return self.hash
+
+    def __repr__(self):
+        return 'Note({!r})'.format(self.note)
+
+
 def see_doc(obj_with_doc):
     """Copy docstring from existing object to the decorated callable."""
     def decorator(fn):
@@ -145,6 +377,18 @@ def see_doc(obj_with_doc):
     return decorator
 
 
+class hybridmethod(object):
+    """Decorator for a method which binds to the class if called on it."""
+    def __init__(self, fn):
+        self.fn = fn
+        self.__doc__ = fn.__doc__
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return types.MethodType(self.fn, objtype)
+        return types.MethodType(self.fn, obj)
+
+
 class Annotator(object):
     """Class intent: serve as a stateless dict of function pointers.
 
@@ -244,8 +488,22 @@ class Annotator(object):
         if hasattr(__fn, '__notes__'):
             msg = 'callable already has notes: {!r}'
             raise AttributeError(msg.format(__fn))
+        notes = tuple(cls.intern_note(note) for note in notes)
+        for arg in keyword_notes:
+            keyword_notes[arg] = cls.intern_note(keyword_notes[arg])
         __fn.__notes__ = (notes, keyword_notes)
 
+    @staticmethod
+    def intern_note(note):
+        """Get interned `Note` of note, or note as-is if it does not parse.
+
+        Invalid notes are left for the injector to reject when resolved.
+        """
+        try:
+            return Note.of(note)
+        except ValueError:
+            return note
+
     @classmethod
     def has_annotations(cls, __fn):
         """True if callable is annotated, else False."""
@@ -275,7 +533,7 @@ class Annotator(object):
             def foobar(foo, bar=None):
                 return
         """
-        return (MAYBE, note)
+        return Note((MAYBE, note))
 
     @staticmethod
     def partial(__fn, *a, **kw):
@@ -304,7 +562,7 @@ class Annotator(object):
         injected partial function is called. See `eager_partial` to inject
         eagerly.
         """
-        return (PARTIAL, (__fn, a, tuple(kw.items())))
+        return Note((PARTIAL, (__fn, a, tuple(kw.items()))))
 
     @staticmethod
     def partial_regardless(__fn, *a, **kw):
@@ -313,7 +571,7 @@ class Annotator(object):
         Use this instead of `partial` when binding a callable that may or may
         not have annotations.
         """
-        return (PARTIAL_REGARDLESS, (__fn, a, tuple(kw.items())))
+        return Note((PARTIAL_REGARDLESS, (__fn, a, tuple(kw.items()))))
 
     @staticmethod
     def eager_partial(__fn, *a, **kw):
@@ -322,7 +580,7 @@ class Annotator(object):
         Use this instead of `partial` when eager injection is needed in place
         of lazy injection.
         """
-        return (EAGER_PARTIAL, (__fn, a, tuple(kw.items())))
+        return Note((EAGER_PARTIAL, (__fn, a, tuple(kw.items()))))
 
     @staticmethod
     def eager_partial_regardless(__fn, *a, **kw):
@@ -331,7 +589,7 @@ class Annotator(object):
         Use this instead of `eager_partial partial` when binding a callable
         that may or may not have annotations.
         """
-        return (EAGER_PARTIAL_REGARDLESS, (__fn, a, tuple(kw.items())))
+        return Note((EAGER_PARTIAL_REGARDLESS, (__fn, a, tuple(kw.items()))))
 
 annotate = Annotator()
 wraps = annotate.wraps
@@ -340,13 +598,466 @@ partial = annotate.partial
 eager_partial = annotate.eager_partial
 
 
+class LRU(object):
+    """Cache of results of a provider by name, see `Injector.provider`.
+
+    Keeps up to `maxsize` names, evicting the least recently used, and keeps
+    each for up to `ttl` seconds if given. Counts `hits` and `misses`.
+
+    The cache given at registration serves as a template; each injector gets
+    its own `empty` copy. Any object with the methods of this class can be
+    used to implement other eviction policies.
+    """
+
+    def __init__(self, maxsize=128, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        #: Cached entries, name -> (value, expiry time or None).
+        self.data = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def empty(self):
+        """Get a new, empty cache with the same bounds."""
+        return type(self)(maxsize=self.maxsize, ttl=self.ttl)
+
+    def get(self, name, default=None):
+        """Get cached value of name, or default on a miss."""
+        with self.lock:
+            entry = self.data.pop(name, None)
+            if entry is None or (
+                    entry[1] is not None and entry[1] <= timer()):
+                self.misses += 1
+                return default
+            # Re-insert as most recently used.
+            self.data[name] = entry
+            self.hits += 1
+            return entry[0]
+
+    def set(self, name, value):
+        """Cache value of name, evicting the least recently used if full."""
+        expiry = None if self.ttl is None else timer() + self.ttl
+        with self.lock:
+            self.data.pop(name, None)
+            self.data[name] = (value, expiry)
+            if self.maxsize is not None and len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+
+    def invalidate(self, name=None):
+        """Discard cached value of name, or of all names if None."""
+        with self.lock:
+            if name is None:
+                self.data.clear()
+            else:
+                self.data.pop(name, None)
+
+    def clear(self):
+        """Discard all cached values and reset counters."""
+        with self.lock:
+            self.data.clear()
+            self.hits = self.misses = 0
+
+    def __contains__(self, name):
+        entry = self.data.get(name)
+        return entry is not None and (entry[1] is None or entry[1] > timer())
+
+    def __len__(self):
+        return len(self.data)
+
+    def after_fork(self):
+        """Replace lock, which may have been held on fork."""
+        self.lock = threading.Lock()
+
+
+class Hook(object):
+    """Receive callbacks as an injector resolves notes, e.g. for tracing.
+
+    Subclass and override the callbacks of interest, then register the hook
+    for all injectors of a class, or for a single injector::
+
+        from jeni import Hook
+
+        class Tracer(Hook):
+            def on_resolve_end(self, injector, note, kind, cached, seconds,
+                               error):
+                print(note, kind, cached, seconds)
+
+        Injector.hook(Tracer())
+        injector = Injector(hooks=[Tracer()])
+        injector.add_hook(Tracer())
+
+    `note` is a `Note`. `kind` is the kind of provider: `CLASS`, `GENERATOR`
+    or `FACTORY`, a partial kind for partial notes, or None when no provider
+    is registered. Durations are wall time in seconds, including resolution
+    of dependencies. Injectors without hooks do not call into hooks at all.
+    """
+
+    def on_resolve_start(self, injector, note):
+        """Called when `get` starts to resolve a note."""
+
+    def on_resolve_end(self, injector, note, kind, cached, seconds, error):
+        """Called when `get` is done, with whether the value was cached.
+
+        On failure, `error` is the exception raised, otherwise None.
+        """
+
+    def on_instantiate(self, injector, note, kind, seconds):
+        """Called when a Provider class or generator is instantiated."""
+
+    def on_close(self, injector, basenote, kind, seconds):
+        """Called when a provider is closed by `Injector.close`."""
+
+
+class Histogram(object):
+    """Distribution of durations in seconds, in logarithmic buckets."""
+
+    __slots__ = ('count', 'sum', 'min', 'max', 'buckets')
+
+    #: Upper bounds of buckets in seconds, doubling from 1 microsecond. The
+    #: last bucket counts everything above the last bound.
+    bounds = tuple(1e-6 * 2 ** n for n in range(28))
+
+    def __init__(self):
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+        self.buckets = [0] * (len(self.bounds) + 1)
+
+    def add(self, seconds):
+        """Record a duration."""
+        self.count += 1
+        self.sum += seconds
+        if self.min is None or seconds < self.min:
+            self.min = seconds
+        if self.max is None or seconds > self.max:
+            self.max = seconds
+        self.buckets[bisect.bisect_left(self.bounds, seconds)] += 1
+
+    def quantile(self, q):
+        """Estimate the q-quantile (0 <= q <= 1), to bucket precision.
+
+        Returns the upper bound of the bucket holding the quantile, limited
+        to the observed min and max, or None if nothing is recorded.
+        """
+        if not self.count:
+            return None
+        if q <= 0:
+            return self.min
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if count and seen >= rank:
+                break
+        if index < len(self.bounds):
+            estimate = self.bounds[index]
+        else:
+            estimate = self.max
+        return min(max(estimate, self.min), self.max)
+
+    def as_dict(self):
+        """Summarize as a dict, with non-empty buckets as (bound, count)."""
+        bounds = self.bounds + (float('inf'),)
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'min': self.min,
+            'max': self.max,
+            'p50': self.quantile(0.5),
+            'p90': self.quantile(0.9),
+            'p99': self.quantile(0.99),
+            'buckets': [(bounds[index], count)
+                        for index, count in enumerate(self.buckets) if count],
+        }
+
+
+class Timings(Hook):
+    """Resolution latency histograms per basenote, see `Injector.__init__`.
+
+    Each `Histogram` is keyed by basenote, event and whether the value came
+    from the injector's cache (a hit) or from the provider (a miss). Events
+    are `INSTANTIATE` (Provider class ``__init__``), `INIT` (generator up to
+    its first yield), `GET` (get without name) and `GET_NAME` (get-by-name).
+    Durations are wall time, including the resolution of dependencies.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+
+        #: Histograms, (basenote, event, hit) -> Histogram.
+        self.histograms = {}
+
+    def record(self, basenote, event, hit, seconds):
+        """Record a duration in seconds."""
+        key = (basenote, event, hit)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.add(seconds)
+
+    def histogram(self, basenote, event=GET, hit=False):
+        """Get Histogram of basenote & event, or None if nothing recorded."""
+        return self.histograms.get((basenote, event, hit))
+
+    def summary(self):
+        """Summarize as dict: basenote -> 'event' or 'event:hit' -> dict.
+
+        See `Histogram.as_dict` for the summary of each histogram.
+        """
+        summary = {}
+        with self.lock:
+            for (basenote, event, hit), histogram in self.histograms.items():
+                if hit:
+                    event = '{}:hit'.format(event)
+                summary.setdefault(basenote, {})[event] = histogram.as_dict()
+        return summary
+
+    def clear(self):
+        """Discard all recorded durations."""
+        with self.lock:
+            self.histograms.clear()
+
+    def on_resolve_end(self, injector, note, kind, cached, seconds, error):
+        if error is None and note.kind not in PARTIAL_KINDS:
+            event = GET if note.name is None else GET_NAME
+            self.record(note.basenote, event, cached, seconds)
+
+    def on_instantiate(self, injector, note, kind, seconds):
+        event = INSTANTIATE if kind == CLASS else INIT
+        self.record(note.basenote, event, False, seconds)
+
+
+class Plan(object):
+    """Injection plan of an annotated callable, see `Injector.plan`.
+
+    Notes are interned and their providers looked up when the plan is built,
+    such that applying the callable only needs to resolve each step.
+    """
+
+    __slots__ = ('version', 'args', 'kwargs', 'bulk')
+
+    def __init__(self, version, args, kwargs, bulk=()):
+        #: Registry version of the injector class at the time of planning.
+        self.version = version
+
+        #: Steps for positional notes, each (`Note`, provider). Provider is
+        #: None when the step must be resolved through `get`.
+        self.args = args
+
+        #: Keyword steps, each (keyword, step, optional).
+        self.kwargs = kwargs
+
+        #: Named notes to get in bulk, each (basenote, notes), for basenotes
+        #: with several required named steps, see `Injector.get_names`.
+        self.bulk = bulk
+
+
+class WeakMethod(object):
+    """Method bound to an object by weak reference, callable as the method.
+
+    Set on an injector in place of a bound method, such that the injector
+    does not reference itself and is freed without the cyclic garbage
+    collector, see `Injector.add_hook`.
+    """
+
+    __slots__ = ('ref', 'function')
+
+    def __init__(self, obj, function):
+        self.ref = weakref.ref(obj)
+        self.function = function
+
+    def __call__(self, *a, **kw):
+        return self.function(self.ref(), *a, **kw)
+
+
+class LazyPartial(object):
+    """Partial application of an annotated callable, see `Injector.partial`.
+
+    Injection happens once, on the first call, under a lock when the
+    injector is thread-safe. The resulting arguments are kept, such that
+    repeat calls without keyword arguments only build the positional tuple.
+    Exposes the name, qualified name, module, doc, ``__wrapped__`` callable
+    and attributes of the function, except for its annotations.
+    """
+
+    __slots__ = ('injector', 'fn', 'args', 'kwargs', 'pack', 'lock',
+                 '__notes__', '__weakref__')
+
+    def __init__(self, injector, fn, args, kwargs):
+        self.injector = injector
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+
+        #: Injected arguments merged with partial arguments, (args, kwargs),
+        #: or None until the first call.
+        self.pack = None
+        self.lock = threading.RLock() if injector.threadsafe else None
+
+    def __call__(self, *run_args, **run_kwargs):
+        pack = self.pack
+        if pack is None:
+            pack = self.inject()
+        args, kwargs = pack
+        if run_kwargs:
+            kwargs = kwargs.copy()
+            kwargs.update(run_kwargs)
+        if run_args:
+            return self.fn(*(args + run_args), **kwargs)
+        return self.fn(*args, **kwargs)
+
+    def inject(self):
+        """Inject arguments once, returning (args, kwargs)."""
+        if self.lock is None:
+            return self._inject()
+        with self.lock:
+            if self.pack is None:
+                return self._inject()
+            return self.pack
+
+    def _inject(self):
+        args, kwargs = self.injector.prepare_callable(self.fn, partial=True)
+        kwargs.update(self.kwargs)
+        self.pack = (args + self.args, kwargs)
+        return self.pack
+
+    @property
+    def __name__(self):
+        return self.fn.__name__
+
+    @property
+    def __wrapped__(self):
+        return self.fn
+
+    __doc__ = property(lambda self: self.fn.__doc__, doc=__doc__)
+    __module__ = property(lambda self: getattr(self.fn, '__module__', None))
+
+    def __getattr__(self, name):
+        # __qualname__ cannot be a property, as the class has its own.
+        if name == '__qualname__':
+            return getattr(self.fn, name, self.fn.__name__)
+        # Attributes of the function, as with functools.wraps, but not its
+        # notes: the partial is annotated on its own, if at all.
+        if name != '__notes__' and not name.startswith('__'):
+            attrs = getattr(self.fn, '__dict__', EMPTY_MAPPING)
+            if name in attrs:
+                return attrs[name]
+        raise AttributeError(name)
+
+    def __repr__(self):
+        return '<{} {!r}>'.format(type(self).__name__, self.fn)
+
+
+class Graph(object):
+    """Static dependency graph of an injector class, see `Injector.graph`.
+
+    Built from annotations alone, without instantiating any provider.
+    """
+
+    def __init__(self, version, dependencies, missing, order=None,
+                 cycles=(), captive=()):
+        #: Registry version of the injector class at the time of building.
+        self.version = version
+
+        #: Dependencies per registered basenote, basenote -> tuple of
+        #: basenotes, in order of annotation.
+        self.dependencies = dependencies
+
+        #: Unresolvable notes which are not `maybe`, each (dependent, `Note`),
+        #: where dependent is a basenote or an entry point callable.
+        self.missing = missing
+
+        #: Dependencies which a singleton would outlive, each (singleton,
+        #: basenote): providers closed with an injector, reached directly or
+        #: through factories, which are not singletons themselves.
+        self.captive = list(captive)
+
+        #: Basenotes in topological order, dependencies first, and
+        #: dependency cycles, each a tuple of basenotes ending where it began.
+        #: Sorted unless given, e.g. from a graph of the same dependencies.
+        if order is None:
+            order, cycles = self.sort(dependencies)
+        self.order, self.cycles = order, cycles
+
+    @property
+    def valid(self):
+        """True if graph has no cycles, missing notes or captive ones."""
+        return not self.cycles and not self.missing and not self.captive
+
+    def errors(self):
+        """Get list of messages describing cycles, missing & captive notes."""
+        errors = []
+        for cycle in self.cycles:
+            errors.append('Dependency cycle: {}'.format(
+                ' <- '.join(repr(basenote) for basenote in cycle)))
+        for dependent, note in self.missing:
+            errors.append('Unable to resolve {!r} for {!r}'.format(
+                note.note, dependent))
+        for singleton, basenote in self.captive:
+            errors.append(captive_message(singleton, basenote))
+        return errors
+
+    @staticmethod
+    def sort(dependencies):
+        """Sort basenotes topologically, returning (order, cycles).
+
+        Dependencies which are not themselves in the map are ignored.
+        """
+        order, cycles = [], []
+        # basenote -> False while on the stack, True when done.
+        done = {}
+        for root in dependencies:
+            if root in done:
+                continue
+            done[root] = False
+            stack = [(root, iter(dependencies[root]))]
+            while stack:
+                basenote, pending = stack[-1]
+                for dependency in pending:
+                    if dependency not in dependencies:
+                        continue
+                    state = done.get(dependency)
+                    if state is None:
+                        done[dependency] = False
+                        stack.append(
+                            (dependency, iter(dependencies[dependency])))
+                        break
+                    elif state is False:
+                        path = [item[0] for item in stack]
+                        cycle = path[path.index(dependency):] + [dependency]
+                        cycles.append(tuple(cycle))
+                else:
+                    stack.pop()
+                    done[basenote] = True
+                    order.append(basenote)
+        return order, cycles
+
+
 class Injector(object):
     """Collects dependencies and reads annotations to inject them."""
     annotator_class = Annotator
     generator_provider = GeneratorProvider
-    re_note = re.compile(r'^(.*?)(?::(.*))?$') # annotation is 'object:name'
-
-    def __init__(self, provide_self=False):
+    # Notes are parsed by `Note`; pattern is compiled on first use.
+    re_note = LazyPattern(r'^(.*?)(?::(.*))?$') # annotation is 'object:name'
+
+    #: Incremented when this class or any of its bases registers a provider.
+    registry_version = 0
+
+    # Short-lived injectors, e.g. one per request, are kept small: attributes
+    # are slots, and containers which are rarely used are created on first
+    # write. The `__dict__` is only created when other attributes are set,
+    # e.g. by subclasses or by `add_hook`.
+    __slots__ = (
+        'closed', 'instances', 'values', 'get_order', 'stats', 'instantiating',
+        'named_caches', 'warmup_times', 'parent', 'scoped', 'threadsafe',
+        'lock', 'locks', 'local', 'compiled', 'abandoned', 'hooks', 'timings',
+        '__dict__', '__weakref__')
+
+    def __init__(self, provide_self=False, threadsafe=False, parent=None,
+                 timings=False, hooks=()):
         """A subclass could take arguments, but should pass keywords to super.
 
         An Injector subclass inherits the provider registry of its base
@@ -372,29 +1083,188 @@ class Injector(object):
             with Injector(provide_self=True) as injector:
                 injector.get('injector')
 
-        Annotate with note 'injector' to inject the injector.
-        """
-        if provide_self:
-            self.value('injector', self)
+        Annotate with note 'injector' to inject the injector. The injector is
+        provided as a value of the instance, not registered on its class, so
+        pass ``provided=['injector']`` to `validate` callables annotated with
+        it.
+
+        To share one injector across threads, ask for a thread-safe
+        injector::
+
+            injector = Injector(threadsafe=True)
+
+        A thread-safe injector instantiates each provider exactly once, with
+        a lock per basenote such that threads only wait on the notes they are
+        resolving. Dependency cycles are tracked per thread, and values which
+        are already provided are returned without taking a lock. Note that
+        `stats` counts are not locked and may undercount under contention.
 
-        self.annotator = self.annotator_class()
+        Injectors can be scoped, e.g. with a long-lived injector for the
+        application and a short-lived child injector for each request::
 
+            class RequestInjector(Injector):
+                "Registers providers which are specific to a request."
+
+            app = Injector(threadsafe=True)
+            with app.child(RequestInjector) as injector:
+                injector.apply(handler)
+
+        A child provides the notes its class registers beyond the class of its
+        parent (see `scoped_notes`), and gets all other notes from its parent,
+        such that the parent instantiates those providers once for all of its
+        children. Closing a child only closes the providers of the child.
+
+        To find out which providers are slow, record resolution latency::
+
+            injector = Injector(timings=True)
+            injector.apply(handler)
+            injector.timings.summary()
+
+        See `Timings`. Timings are kept across `reset`, and can be shared by
+        injectors by passing a `Timings` instance.
+
+        Timings are implemented as a `Hook`; pass any other hooks in `hooks`,
+        in addition to hooks registered on the class with `hook`. Injectors
+        without hooks do not pay for instrumentation on `get`.
+        """
         self.closed = False
-        self.instances = {}
+
+        #: Provider instances, basenote -> instance, see `instantiate`.
+        #: Created on first instance, since factories have none.
+        self.instances = EMPTY_MAPPING
+
+        #: Provided values, basenote -> value. Created eagerly, since any get
+        #: writes to it, and compiled functions hold on to it (see `compile`).
         self.values = {}
+        if provide_self:
+            self.values['injector'] = self
 
-        self.get_order = []
+        #: Basenotes in the order first provided, basenote -> None.
+        #: Ordered dict for constant-time membership; close reverses it.
+        self.get_order = ordered_dict()
 
         #: Statistics for resolved notes, note -> count.
         #: Records counts as soon as get is called, even if unset or error.
+        #: Like `values` and `get_order`, created eagerly, since every get
+        #: writes to it; a check for a placeholder would cost more.
         self.stats = collections.defaultdict(int)
 
-        #: Collection of note tuples which are currently being instantiated.
-        #: This allows for dependency cycle checks.
-        self.instantiating = []
+        #: Stack of note tuples which are currently being instantiated, as an
+        #: ordered dict of note tuple -> None. This allows for constant-time
+        #: dependency cycle checks. Created on first `resolve`, since
+        #: thread-safe injectors keep a stack per thread, and injectors of a
+        #: validated class skip the checks.
+        self.instantiating = EMPTY_MAPPING
+
+        #: Caches of results by name, basenote -> cache, see `provider`.
+        #: Created on first result by name, see `named_cache`, such that
+        #: their counters start after the first miss.
+        self.named_caches = EMPTY_MAPPING
+
+        #: Seconds to provide each basenote on `warmup`, basenote -> seconds.
+        self.warmup_times = EMPTY_MAPPING
+
+        #: Parent injector of a child injector, see `child`.
+        self.parent = parent
+        if parent is not None:
+            #: Basenotes which this child provides itself.
+            self.scoped = self.scoped_notes(type(parent))
+
+        #: Thread-safe injectors hold a lock per basenote, see `__init__`.
+        self.threadsafe = threadsafe
+        if threadsafe:
+            self.lock = threading.Lock()
+            self.locks = {}
+            self.local = threading.local()
+        else:
+            self.lock = self.locks = self.local = None
+
+        #: Functions generated by `compile`, callable -> function.
+        self.compiled = EMPTY_MAPPING
+
+        #: Provider instances of a parent process, see `after_fork`.
+        self.abandoned = ()
+
+        #: Hooks of this injector, see `Hook`.
+        self.hooks = self.class_hooks()
+        for hook in hooks:
+            self.add_hook(hook)
+
+        #: Resolution latency, see `Timings`, or None if not recording.
+        self.timings = None
+        if timings:
+            self.record_timings(None if timings is True else timings)
+        elif self.hooks:
+            self.instrument()
+
+    def add_hook(self, hook):
+        """Add a `Hook` to this injector.
+
+        Instrumented implementations of `get` and `get_step` are set on this
+        injector, such that injectors without hooks keep the plain ones.
+        """
+        self.hooks = self.hooks + (hook,)
+        self.instrument()
+        # Compiled functions inline resolution; rebuild them with hooks.
+        if self.compiled:
+            self.compiled.clear()
+
+    def instrument(self):
+        """Set `hooked_get` & `hooked_get_step` as `get` & `get_step`.
+
+        Each is a `WeakMethod`, since a bound method set on the injector
+        would be a reference cycle, leaving the injector to the cyclic
+        garbage collector.
+        """
+        cls = type(self)
+        self.get = WeakMethod(self, cls.hooked_get)
+        self.get_step = WeakMethod(self, cls.hooked_get_step)
+
+    def record_timings(self, timings=None):
+        """Start recording resolution latency into given or new `Timings`."""
+        if timings is None:
+            timings = Timings()
+        self.timings = timings
+        self.add_hook(timings)
+
+    @classmethod
+    def hook(cls, hook):
+        """Register a `Hook` for injectors of this class and its subclasses.
+
+        Applies to injectors created after registration. Returns the hook.
+        """
+        if 'hook_registry' not in vars(cls):
+            cls.hook_registry = []
+        cls.hook_registry.append(hook)
+        for c in cls.class_tree():
+            if 'hooks_cache' in vars(c):
+                del c.hooks_cache
+        return hook
+
+    @classmethod
+    def class_hooks(cls):
+        """Get hooks registered on this class and its bases, as a tuple."""
+        hooks = vars(cls).get('hooks_cache')
+        if hooks is None:
+            hooks = []
+            for c in reversed(cls.mro()):
+                hooks.extend(vars(c).get('hook_registry', ()))
+            hooks = cls.hooks_cache = tuple(hooks)
+        return hooks
+
+    def child(self, injector_class=None, **kw):
+        """Create a child injector of this injector, see `__init__`.
+
+        The child is an instance of the given injector class, by default the
+        class of this injector, and gets keyword arguments given here.
+        """
+        if injector_class is None:
+            injector_class = type(self)
+        return injector_class(parent=self, **kw)
 
     @classmethod
-    def provider(cls, note, provider=None, name=False):
+    def provider(cls, note, provider=None, name=False, cache=None,
+                 fork_safe=True, lifetime=SCOPED):
         """Register a provider, either a Provider class or a generator.
 
         Provider class::
@@ -429,18 +1299,53 @@ class Injector(object):
         Registration can be a decorator or a direct method call::
 
             Injector.provider('hello', HelloProvider)
+
+        To keep results of get-by-name, e.g. of lookups in a key-value store,
+        give a cache, which each injector copies::
+
+            Injector.provider('user', UserProvider, cache=LRU(10000, ttl=30))
+
+        See `LRU` and `Injector.invalidate`.
+
+        Providers which hold state that does not survive a fork, e.g. sockets
+        of a generator, are registered with ``fork_safe=False`` to be rebuilt
+        in each child process, see `after_fork`.
+
+        The `lifetime` of what is provided is one of:
+
+        * ``'scoped'``, the default: the provider is instantiated once per
+          injector, and its value kept until the injector is closed.
+        * ``'transient'``: the value is provided anew on each get and never
+          kept by the injector, e.g. for large per-call buffers. A Provider
+          class is still instantiated once per injector. Not for generators,
+          whose value lives until the generator is closed.
+        * ``'singleton'``: the provider and its value are shared by all
+          injectors of the registering class and its subclasses, which do
+          not close it; see `close_singletons`. Providers which a singleton
+          depends on, directly or through factories, must be singletons too,
+          since it outlives the injector which built it; otherwise getting
+          it raises ValueError, as does `validate`. Singletons are prepared
+          once per process on `after_fork`.
+        * ``'per_name'``: as scoped, and results of get-by-name are kept for
+          the life of the injector, unless a `cache` is given to bound them.
+
+        For example::
+
+            Injector.provider('buffer', BufferProvider, lifetime='transient')
         """
         def decorator(fn_or_class):
-            if inspect.isgeneratorfunction(fn_or_class):
+            if isgeneratorfunction(fn_or_class):
                 fn = fn_or_class
                 fn.support_name = name
-                cls.register(note, fn)
+                cls.register(note, fn, cache=cache, fork_safe=fork_safe,
+                             lifetime=lifetime)
             else:
                 provider = fn_or_class
                 if not hasattr(provider, 'get'):
                     msg = "{!r} does not meet provider interface with 'get'"
                     raise ValueError(msg.format(provider))
-                cls.register(note, provider)
+                cls.register(note, provider, cache=cache,
+                             fork_safe=fork_safe, lifetime=lifetime)
             return fn_or_class
         if provider is not None:
             decorator(provider)
@@ -448,7 +1353,8 @@ class Injector(object):
             return decorator
 
     @classmethod
-    def factory(cls, note, fn=None):
+    def factory(cls, note, fn=None, cache=None, fork_safe=True,
+                lifetime=SCOPED):
         """Register a function as a provider.
 
         Function (name support is optional)::
@@ -466,12 +1372,17 @@ class Injector(object):
         Registration can be a decorator or a direct method call::
 
             Injector.factory('echo', echo)
+
+        Results of get-by-name can be cached, factories marked as not
+        fork-safe, and lifetimes declared, as with `provider`.
         """
         if fn is not None:
-            cls.register(note, fn)
+            cls.register(note, fn, cache=cache, fork_safe=fork_safe,
+                         lifetime=lifetime)
         else:
             def decorator(f):
-                cls.register(note, f)
+                cls.register(note, f, cache=cache, fork_safe=fork_safe,
+                             lifetime=lifetime)
                 return f
             return decorator
 
@@ -483,12 +1394,309 @@ class Injector(object):
         """
         cls.factory(note, lambda: scalar)
 
+    @classmethod
+    def plan(cls, fn, partial=False):
+        """Get the injection plan of an annotated callable.
+
+        Plans are built once per callable and cached on the injector class,
+        keyed on the callable (held by weak reference) and rebuilt whenever
+        the class's registry version changes. With `partial`, keyword notes
+        which cannot be provided are skipped, as in `Injector.partial`.
+        """
+        key = getattr(fn, '__func__', fn)
+        cache = vars(cls).get('plan_cache')
+        if cache is None:
+            cache = cls.plan_cache = weakref.WeakKeyDictionary()
+        try:
+            plans = cache.get(key)
+        except TypeError:
+            # Callable does not support weak references; do not cache.
+            return cls.build_plan(fn, partial=partial)
+        if plans is None:
+            plans = cache[key] = [None, None]
+        plan = plans[bool(partial)]
+        if plan is None or plan.version != cls.registry_version:
+            plan = plans[bool(partial)] = cls.build_plan(fn, partial=partial)
+        return plan
+
+    @classmethod
+    def build_plan(cls, fn, partial=False):
+        """Implementation to build an injection plan, see `plan`."""
+        notes, keyword_notes = cls.annotator_class.get_annotations(fn)
+        return cls.plan_notes(notes, keyword_notes, partial=partial)
+
+    @classmethod
+    def plan_notes(cls, notes, keyword_notes, partial=False):
+        """Build an injection plan of the given notes, without caching."""
+        version = cls.registry_version
+        args = tuple([cls.plan_note(note) for note in notes])
+        kwargs = []
+        for arg in keyword_notes:
+            note, optional = Note.of(keyword_notes[arg]), bool(partial)
+            if note.kind == MAYBE:
+                note, optional = note.inner, True
+            kwargs.append((arg, cls.plan_note(note), optional))
+        required = list(args)
+        required.extend(step for _, step, optional in kwargs if not optional)
+        return Plan(version, args, tuple(kwargs), cls.plan_bulk(required))
+
+    @classmethod
+    def plan_bulk(cls, steps):
+        """Group named steps by basenote where there are several names."""
+        groups = collections.OrderedDict()
+        for note, provider_or_fn in steps:
+            if provider_or_fn is None or note.name is None:
+                continue
+            group = groups.setdefault(note.basenote, [])
+            if note not in group:
+                group.append(note)
+        return tuple((basenote, tuple(notes))
+                     for basenote, notes in groups.items() if len(notes) > 1)
+
+    @classmethod
+    def plan_note(cls, note):
+        """Intern note & look up its provider for use as a plan step."""
+        note = Note.of(note)
+        if note.kind in PARTIAL_KINDS:
+            return (note, None)
+        try:
+            provider = cls.lookup(note.basenote)
+        except LookupError:
+            # Let `get` raise on resolution, as it would without a plan.
+            provider = None
+        return (note, provider)
+
+    @classmethod
+    def save_plans(cls, filename):
+        """Record which callables are planned, for `load_plans` on startup.
+
+        Writes a JSON file listing, for this class and each of its
+        subclasses, the qualified names of the callables which injectors of
+        that class have planned so far. Callables whose name does not resolve
+        back to them, e.g. lambdas, nested functions and methods on Python 2,
+        are left out. Returns the number of
+        callables written. Write the file once a process is warm, e.g. on
+        shutdown; it is replaced atomically.
+        """
+        import json
+        injectors = {}
+        count = 0
+        for c in cls.class_tree():
+            class_name = qualified_name(c)
+            plan_cache = vars(c).get('plan_cache')
+            if class_name is None or not plan_cache:
+                continue
+            entries = []
+            for fn, plans in list(plan_cache.items()):
+                name = qualified_name(fn)
+                if name is not None and resolve_name(name) is fn:
+                    planned = [plan is not None for plan in plans]
+                    entries.append([name, planned])
+            if entries:
+                injectors[class_name] = sorted(entries)
+                count += len(entries)
+        data = {'jeni': __version__, 'injectors': injectors}
+        temporary = '{}.{}.tmp'.format(filename, os.getpid())
+        with open(temporary, 'w') as fd:
+            json.dump(data, fd, indent=1, sort_keys=True)
+        if hasattr(os, 'replace'):
+            os.replace(temporary, filename)
+        else:
+            if os.path.exists(filename):
+                os.remove(filename)
+            os.rename(temporary, filename)
+        return count
+
+    @classmethod
+    def load_plans(cls, filename):
+        """Build plans of callables recorded by `save_plans`, ahead of use.
+
+        Such that the first call of each callable is as fast as later calls::
+
+            Injector.load_plans('/var/cache/app/jeni-plans.json')
+
+        Call once the modules of the callables are imported; the file does
+        not import anything. Plans are built from the callables as imported
+        now, never from the file, so a stale file cannot change what is
+        injected: entries for this class and its subclasses whose names no
+        longer resolve to an annotated callable are skipped. A file which is
+        missing, unreadable or from another version of jeni is ignored.
+        Returns the number of callables planned.
+        """
+        import json
+        try:
+            with open(filename) as fd:
+                data = json.load(fd)
+        except (IOError, OSError, ValueError):
+            return 0
+        if not isinstance(data, dict) or data.get('jeni') != __version__:
+            return 0
+        classes = dict((qualified_name(c), c) for c in cls.class_tree())
+        count = 0
+        for class_name, entries in data.get('injectors', {}).items():
+            c = classes.get(class_name)
+            if c is None:
+                continue
+            for name, kinds in entries:
+                fn = resolve_name(name)
+                if fn is None or not c.annotator_class.has_annotations(fn):
+                    continue
+                for partial, planned in enumerate(kinds):
+                    if planned:
+                        c.plan(fn, partial=bool(partial))
+                count += 1
+        return count
+
     def apply(self, fn, *a, **kw):
         """Fully apply annotated callable, returning callable's result."""
         args, kwargs = self.prepare_callable(fn)
         args += a; kwargs.update(kw)
         return fn(*args, **kwargs)
 
+    def compile(self, fn):
+        """Generate a function which applies annotated callable, see `apply`.
+
+        ``injector.compile(fn)(*a, **kw)`` is equivalent to
+        ``injector.apply(fn, *a, **kw)``, but the generated function has its
+        injection plan unrolled, with providers and provided values bound as
+        locals, such that values already provided are a dict hit each::
+
+            handle = injector.compile(handler)
+            handle(request)
+
+        The function rebuilds itself when the registry of the injector class
+        changes or hooks are added. Its Python source is available as
+        ``__source__``, and shows in tracebacks.
+
+        Bound methods are compiled per instance, since the generated function
+        calls the method it was compiled from.
+        """
+        if getattr(fn, '__self__', None) is not None:
+            # The compiled function holds the instance, so its id is unique.
+            key = (getattr(fn, '__func__', fn), id(fn.__self__))
+        else:
+            key = fn
+        compiled = self.compiled.get(key)
+        if compiled is None or compiled.version != type(self).registry_version:
+            if self.compiled is EMPTY_MAPPING:
+                self.compiled = {}
+            compiled = self.compiled[key] = self.build_compiled(fn, key)
+        return compiled
+
+    def build_compiled(self, fn, key):
+        """Implementation to generate function for `compile`."""
+        plan = self.plan(fn)
+        namespace = {
+            '_injector': self,
+            '_cls': type(self),
+            '_version': plan.version,
+            '_compiled': self.compiled,
+            '_key': key,
+            '_fn': fn,
+            '_stats': self.stats,
+            '_values': self.values,
+            '_resolve': self.resolve,
+            '_get': self.get,
+            '_get_step': self.get_step,
+            '_prepare_plan': self.prepare_plan,
+            '_plan': plan,
+        }
+        name = 'apply_{}'.format(getattr(fn, '__name__', 'fn'))
+        import re
+        if not re.match(r'^[A-Za-z_][A-Za-z0-9_]*$', name):
+            name = 'apply_fn'
+        lines = [
+            'def {}(*a, **kw):'.format(name),
+            '    if (_cls.registry_version != _version'
+            ' or _compiled.get(_key) is not {}):'.format(name),
+            '        return _injector.compile(_fn)(*a, **kw)',
+        ]
+        steps = [(None, step, False) for step in plan.args]
+        steps.extend(plan.kwargs)
+        if plan.bulk:
+            # Leave grouping of names to the generic implementation.
+            lines.append('    args, kwargs = _prepare_plan(_plan)')
+            lines.append('    if kw:')
+            lines.append('        kwargs.update(kw)')
+            lines.append('    return _fn(*(args + a), **kwargs)')
+            steps = []
+        elif steps:
+            lines.append('    if _injector.closed:')
+            lines.append("        raise RuntimeError("
+                         "'{!r} already closed'.format(_injector))")
+        # Plain get_step is unrolled unless the injector instruments it.
+        inline = 'get_step' not in vars(self)
+        for index, (arg, step, optional) in enumerate(steps):
+            note, provider_or_fn = step
+            value = '_v{}'.format(index)
+            namespace['_s{}'.format(index)] = step
+            namespace['_n{}'.format(index)] = note
+            namespace['_p{}'.format(index)] = provider_or_fn
+            indent = '    '
+            if optional:
+                lines.append('    try:')
+                indent = '        '
+            if provider_or_fn is None:
+                body = ['{} = _get(_n{})'.format(value, index)]
+            elif not inline or note.basenote in self.caches():
+                body = ['{} = _get_step(_s{})'.format(value, index)]
+            elif note.name is None:
+                namespace['_b{}'.format(index)] = note.basenote
+                namespace['_k{}'.format(index)] = note.note
+                body = [
+                    '_stats[_k{}] += 1'.format(index),
+                    'if _b{0} in _values:'.format(index),
+                    '    {} = _values[_b{}]'.format(value, index),
+                    'else:',
+                    '    {0} = _resolve(_p{1}, _n{1})'.format(value, index),
+                ]
+            else:
+                namespace['_k{}'.format(index)] = note.note
+                body = [
+                    '_stats[_k{}] += 1'.format(index),
+                    '{0} = _resolve(_p{1}, _n{1})'.format(value, index),
+                ]
+            lines.extend(indent + line for line in body)
+            if optional:
+                lines.append('    except LookupError:')
+                lines.append('        {} = _MISSING'.format(value))
+        if not plan.bulk:
+            args = ['_v{}'.format(index) for index in range(len(plan.args))]
+            args.append('*a')
+            kwargs = list(enumerate(plan.kwargs, len(plan.args)))
+            if not any(optional for _, (_, _, optional) in kwargs):
+                lines.append('    kwargs = {{{}}}'.format(', '.join(
+                    '{!r}: _v{}'.format(arg, index)
+                    for index, (arg, _, _) in kwargs)))
+            else:
+                # Keep keyword order of `apply`, skipping missing values.
+                lines.append('    kwargs = {}')
+                for index, (arg, step, optional) in kwargs:
+                    indent = '    '
+                    if optional:
+                        lines.append(
+                            '    if _v{} is not _MISSING:'.format(index))
+                        indent = '        '
+                    lines.append(
+                        indent + 'kwargs[{!r}] = _v{}'.format(arg, index))
+            lines.append('    if kw:')
+            lines.append('        kwargs.update(kw)')
+            lines.append('    return _fn({}, **kwargs)'.format(', '.join(args)))
+            namespace['_MISSING'] = MISSING
+        source = '\n'.join(lines) + '\n'
+        filename = '<jeni compiled {}>'.format(name)
+        exec(compile(source, filename, 'exec'), namespace)
+        compiled = namespace[name]
+        compiled.version = plan.version
+        compiled.__source__ = source
+        compiled.__wrapped__ = fn
+        compiled.__doc__ = getattr(fn, '__doc__', None)
+        # Register source for tracebacks & inspect, as is done for doctests.
+        import linecache
+        linecache.cache[filename] = (
+            len(source), None, source.splitlines(True), filename)
+        return compiled
+
     def partial(self, fn, *user_args, **user_kwargs):
         """Return function with closure to lazily inject annotated callable.
 
@@ -512,25 +1720,11 @@ class Injector(object):
         argument order here.
 
         `annotate.partial` accepts arguments in same manner as this `partial`.
+
+        Returns a `LazyPartial`.
         """
-        self.get_annotations(fn) # Assert has annotations.
-        def lazy_injection_fn(*run_args, **run_kwargs):
-            arg_pack = getattr(lazy_injection_fn, 'arg_pack', None)
-            if arg_pack is not None:
-                pack_args, pack_kwargs = arg_pack
-            else:
-                jeni_args, jeni_kwargs = self.prepare_callable(fn, partial=True)
-                pack_args = jeni_args + user_args
-                pack_kwargs = {}
-                pack_kwargs.update(jeni_kwargs)
-                pack_kwargs.update(user_kwargs)
-                lazy_injection_fn.arg_pack = (pack_args, pack_kwargs)
-            final_args = pack_args + run_args
-            final_kwargs = {}
-            final_kwargs.update(pack_kwargs)
-            final_kwargs.update(run_kwargs)
-            return fn(*final_args, **final_kwargs)
-        return lazy_injection_fn
+        self.plan(fn, partial=True) # Assert has annotations.
+        return LazyPartial(self, fn, user_args, user_kwargs)
 
     def eager_partial(self, fn, *a, **kw):
         """Partially apply annotated callable, returning a partial function.
@@ -567,133 +1761,633 @@ class Injector(object):
             return self.eager_partial(fn, *a, **kw)
         return functools.partial(fn, *a, **kw)
 
+    def iapply(self, fn, iterable, batch=None):
+        """Apply annotated callable to each item of iterable, lazily.
+
+        Injected arguments are resolved once, on call, then each item is
+        passed as the last positional argument, as in `apply`, with results
+        yielded as the returned generator is consumed::
+
+            for result in injector.iapply(handle, messages):
+                pass
+
+        With `batch`, items are passed in lists of up to `batch` items, with
+        one result per list. When the generator is closed before the end,
+        e.g. when the consumer stops early, the iterable is closed too, if it
+        has a `close` method. The injector is left open.
+        """
+        args, kwargs = self.prepare_callable(fn)
+        return iter_apply(functools.partial(fn, *args, **kwargs),
+                          iterable, batch=batch)
+
+    @classmethod
+    def map(cls, fn, iterable, processes=None, chunksize=1, backlog=2, **kw):
+        """Apply annotated callable to each item on a process pool, as a list.
+
+        See `imap`, which this collects in order.
+        """
+        return list(cls.imap(
+            fn, iterable, processes=processes, chunksize=chunksize,
+            backlog=backlog, **kw))
+
+    @classmethod
+    def imap(cls, fn, iterable, processes=None, chunksize=1, backlog=2,
+             ordered=True, **kw):
+        """Apply annotated callable to each item on a process pool, lazily.
+
+        Each worker process creates one injector of this class, passing
+        keywords `kw`, and prepares `fn` once with `prepare_callable`. Items
+        are then passed in chunks of `chunksize` as the last positional
+        argument, as in `apply`::
+
+            @annotate('db')
+            def process(db, record):
+                return db.save(record)
+
+            for result in Injector.imap(process, records, chunksize=100):
+                pass
+
+        Callable and injector class must be importable by name when the
+        platform starts processes by spawning rather than forking. Injectors
+        are closed when the workers exit, once all items are done.
+
+        At most `backlog` chunks per process are in flight, such that memory
+        stays bounded however long `iterable` is. Results are in the order of
+        the items, or with ``ordered=False`` in the order of completion, see
+        `imap_unordered`. The first error of `fn` is raised once chunks in
+        flight are done. `processes` defaults to the number of CPUs.
+        """
+        import multiprocessing
+        try:
+            import queue
+        except ImportError:
+            import Queue as queue
+        if processes is None:
+            processes = multiprocessing.cpu_count()
+        items = iter(iterable)
+        chunks = iter(lambda: list(itertools.islice(items, chunksize)), [])
+        pool = multiprocessing.Pool(
+            processes, initializer=init_pool_worker, initargs=(cls, fn, kw))
+
+        # Chunks in flight: results in order, or else completed (values,
+        # error) pairs as put by callbacks of the pool.
+        in_flight, completed = collections.deque(), queue.Queue()
+        callbacks = {'callback': completed.put}
+        if sys.version_info[0] >= 3:
+            callbacks['error_callback'] = lambda e: completed.put((None, e))
+
+        def submit(chunk):
+            if ordered:
+                result = pool.apply_async(run_pool_chunk, (chunk,))
+            else:
+                result = pool.apply_async(
+                    run_pool_chunk, (chunk,), **callbacks)
+            in_flight.append(result)
+
+        try:
+            for chunk in itertools.islice(chunks, processes * backlog):
+                submit(chunk)
+            while in_flight:
+                result = in_flight.popleft()
+                if ordered:
+                    values, error = result.get()
+                else:
+                    values, error = completed.get()
+                if error is not None:
+                    raise error
+                for chunk in itertools.islice(chunks, 1):
+                    submit(chunk)
+                for value in values:
+                    yield value
+        finally:
+            # Let workers finish chunks in flight, and close their injectors.
+            pool.close()
+            pool.join()
+
+    @classmethod
+    def imap_unordered(cls, fn, iterable, processes=None, chunksize=1,
+                       backlog=2, **kw):
+        """Like `imap`, with results in the order in which chunks complete."""
+        return cls.imap(
+            fn, iterable, processes=processes, chunksize=chunksize,
+            backlog=backlog, ordered=False, **kw)
+
     def get(self, note):
-        """Resolve a single note into an object."""
+        """Resolve a single note, raw or `Note`, into an object."""
         if self.closed:
             raise RuntimeError('{!r} already closed'.format(self))
 
+        note = Note.of(note)
+
         # Record request for note even if it fails to resolve.
-        self.stats[note] += 1
+        self.stats[note.note] += 1
 
         # Handle injection of partially applied annotated functions.
-        if isinstance(note, tuple) and len(note) == 2:
-            if note[0] == PARTIAL:
-                fn, a, kw_items = note[1]
+        kind = note.kind
+        if kind in PARTIAL_KINDS:
+            fn, a, kw_items = note.inner
+            if kind == PARTIAL:
                 return self.partial(fn, *a, **dict(kw_items))
-            elif note[0] == PARTIAL_REGARDLESS:
-                fn, a, kw_items = note[1]
+            elif kind == PARTIAL_REGARDLESS:
                 return self.partial_regardless(fn, *a, **dict(kw_items))
-            elif note[0] == EAGER_PARTIAL:
-                fn, a, kw_items = note[1]
+            elif kind == EAGER_PARTIAL:
                 return self.eager_partial(fn, *a, **dict(kw_items))
-            elif note[0] == EAGER_PARTIAL_REGARDLESS:
-                fn, a, kw_items = note[1]
+            elif kind == EAGER_PARTIAL_REGARDLESS:
                 return self.eager_partial_regardless(fn, *a, **dict(kw_items))
 
-        basenote, name = self.parse_note(note)
-        if name is None and basenote in self.values:
-            return self.values[basenote]
+        if note.name is None:
+            if note.basenote in self.values:
+                return self.values[note.basenote]
+        elif note.basenote in self.named_caches:
+            value = self.named_caches[note.basenote].get(note.name, MISSING)
+            if value is not MISSING:
+                return value
+        try:
+            provider_or_fn = self.lookup(note.basenote)
+        except LookupError:
+            if self.parent is not None:
+                return self.resolve_parent(note)
+            msg = "Unable to resolve '{}'"
+            raise LookupError(msg.format(note.note))
+        return self.resolve(provider_or_fn, note)
+
+    def get_many(self, notes):
+        """Resolve notes, raw or `Note`, into a list of objects.
+
+        Named notes of the same basenote are resolved in one call to
+        `Provider.get_many` where there are several, see `get_names`. All
+        other notes are resolved one by one with `get`.
+        """
+        notes = [Note.of(note) for note in notes]
+        groups = collections.OrderedDict()
+        for note in notes:
+            if note.kind == PLAIN and note.name is not None:
+                group = groups.setdefault(note.basenote, [])
+                if note not in group:
+                    group.append(note)
+        bulk = {}
+        for basenote, group in groups.items():
+            if len(group) > 1:
+                bulk.update(zip(group, self.get_names(basenote, group)))
+        return [bulk[note] if note in bulk else self.get(note)
+                for note in notes]
+
+    def get_names(self, basenote, notes):
+        """Resolve named `Note` objects of one basenote in a single request.
+
+        Providers implementing `Provider.get_many` get all names at once,
+        otherwise the injector falls back to getting each name in turn.
+        """
+        if self.closed:
+            raise RuntimeError('{!r} already closed'.format(self))
+        for note in notes:
+            self.stats[note.note] += 1
+        if self.parent is not None and basenote not in self.scoped:
+            return self.parent.get_many(notes)
         try:
             provider_or_fn = self.lookup(basenote)
         except LookupError:
+            if self.parent is not None:
+                return self.parent.get_many(notes)
             msg = "Unable to resolve '{}'"
-            raise LookupError(msg.format(note))
+            raise LookupError(msg.format(notes[0].note))
+        names = tuple(note.name for note in notes)
+        hooks = self.hooks
+        if not hooks:
+            return self.resolve(provider_or_fn, notes[0], names=names)
+        for note in notes:
+            for hook in hooks:
+                hook.on_resolve_start(self, note)
+        kind = provider_kind(provider_or_fn)
+        start = timer()
+        error = None
+        try:
+            return self.resolve(provider_or_fn, notes[0], names=names)
+        except BaseException:
+            error = sys.exc_info()[1]
+            raise
+        finally:
+            seconds = timer() - start
+            for note in notes:
+                for hook in hooks:
+                    hook.on_resolve_end(
+                        self, note, kind, False, seconds, error)
+
+    def get_step(self, step):
+        """Resolve a single plan step into an object, see `plan`."""
+        note, provider_or_fn = step
+        if provider_or_fn is None:
+            return self.get(note)
+        if self.closed:
+            raise RuntimeError('{!r} already closed'.format(self))
+        self.stats[note.note] += 1
+        if note.name is None:
+            if note.basenote in self.values:
+                return self.values[note.basenote]
+        elif note.basenote in self.named_caches:
+            value = self.named_caches[note.basenote].get(note.name, MISSING)
+            if value is not MISSING:
+                return value
+        return self.resolve(provider_or_fn, note)
+
+    def hooked_get(self, note):
+        """Implementation of `get` which calls hooks, see `Hook`."""
+        note = Note.of(note)
+        return self.call_hooked(type(self).get, note, note)
+
+    def hooked_get_step(self, step):
+        """Implementation of `get_step` which calls hooks, see `Hook`."""
+        if step[1] is None:
+            return self.get(step[0])
+        return self.call_hooked(type(self).get_step, step, step[0])
+
+    def call_hooked(self, get, arg, note):
+        """Call unbound `get` implementation with arg, calling hooks."""
+        hooks = self.hooks
+        for hook in hooks:
+            hook.on_resolve_start(self, note)
+        if note.name is None:
+            cached = note.basenote in self.values
+        else:
+            cache = self.named_caches.get(note.basenote)
+            cached = cache is not None and note.name in cache
+        start = timer()
+        error = None
+        try:
+            return get(self, arg)
+        except BaseException:
+            error = sys.exc_info()[1]
+            raise
+        finally:
+            seconds = timer() - start
+            if note.kind in PARTIAL_KINDS:
+                kind = note.kind
+            else:
+                try:
+                    kind = provider_kind(self.lookup(note.basenote))
+                except LookupError:
+                    kind = None
+            for hook in hooks:
+                hook.on_resolve_end(self, note, kind, cached, seconds, error)
 
-        self.instantiating.append((basenote, name))
+    def resolve(self, provider_or_fn, note, names=None):
+        """Get value from provider for `Note`, checking dependency cycles.
+
+        With `names`, get a list of values by name in bulk on behalf of note.
+        """
+        if self.parent is not None and note.basenote not in self.scoped:
+            return self.resolve_parent(note)
+        if self.threadsafe:
+            return self.resolve_threadsafe(provider_or_fn, note, names)
+        cls = type(self)
+        if cls.__dict__.get('validated_version') == cls.registry_version \
+                and 'injector' not in self.values:
+            # Graph is free of cycles, see `validate`.
+            return self.handle_provider(provider_or_fn, note, names)
+        instantiating = self.instantiating
+        if instantiating is EMPTY_MAPPING:
+            instantiating = self.instantiating = ordered_dict()
+        key = note.key
+        if key in instantiating:
+            notes = tuple(instantiating) + (key,)
+            stack = ' <- '.join(repr(key) for key in notes)
+            raise DependencyCycleError(stack, notes=notes)
+        instantiating[key] = None
         try:
-            if self.instantiating.count((basenote, name)) > 1:
-                stack = ' <- '.join(repr(note) for note in self.instantiating)
-                notes = tuple(self.instantiating)
-                raise DependencyCycleError(stack, notes=notes)
+            return self.handle_provider(provider_or_fn, note, names)
+        finally:
+            instantiating.popitem()
+
+    def resolve_parent(self, note):
+        """Get value for `Note` from the parent of this child injector.
 
-            return self.handle_provider(provider_or_fn, note)
+        Values are kept by the child for subsequent gets, but the parent
+        remains responsible for its providers, including closing them.
+        """
+        value = self.parent.get(note)
+        if note.name is None and type(self.parent).lifetimes().get(
+                note.basenote) != TRANSIENT:
+            self.values[note.basenote] = value
+        return value
+
+    def resolve_threadsafe(self, provider_or_fn, note, names=None):
+        """Implementation of `resolve` for thread-safe injectors.
+
+        The instantiation stack is per thread, and the provider is called
+        while holding the lock of its basenote. Values provided by another
+        thread while waiting on the lock are returned as-is.
+        """
+        instantiating = getattr(self.local, 'instantiating', None)
+        if instantiating is None:
+            instantiating = collections.OrderedDict()
+            self.local.instantiating = instantiating
+        key = note.key
+        if key in instantiating:
+            notes = tuple(instantiating) + (key,)
+            stack = ' <- '.join(repr(key) for key in notes)
+            raise DependencyCycleError(stack, notes=notes)
+        basenote = note.basenote
+        lock = self.basenote_lock(basenote)
+        instantiating[key] = None
+        try:
+            with lock:
+                if note.name is None and basenote in self.values:
+                    return self.values[basenote]
+                return self.handle_provider(provider_or_fn, note, names)
         finally:
-            self.instantiating.pop()
+            instantiating.popitem()
 
-    def close(self):
+    def basenote_lock(self, basenote):
+        """Get lock of basenote of a thread-safe injector, see `__init__`."""
+        lock = self.locks.get(basenote)
+        if lock is None:
+            with self.lock:
+                lock = self.locks.setdefault(basenote, threading.RLock())
+        return lock
+
+    def close(self, max_workers=1, timeout=None):
         """Close injector & injected Provider instances, including generators.
 
         Providers are closed in the reverse order in which they were opened,
         and each provider is only closed once. Providers are only closed if
         they have successfully provided a dependency via get.
+
+        With `max_workers` above 1, or a `timeout`, providers are closed on
+        threads instead. Following the dependency `graph`, a provider is
+        closed once all providers which depend on it are closed, such that
+        independent providers close concurrently::
+
+            injector.close(max_workers=4, timeout=5)
+
+        A provider which takes longer than `timeout` seconds to close is left
+        to finish on its own, as `CloseTimeoutError`, and its dependencies
+        are closed regardless. Errors are collected until all providers are
+        done, then raised as `CloseError`.
         """
         if self.closed:
             raise RuntimeError('{!r} already closed'.format(self))
+        if max_workers > 1 or timeout is not None:
+            return self.close_concurrently(max_workers, timeout)
         for basenote in reversed(self.get_order):
             if basenote not in self.instances:
                 # Provider is not an instance; no close implementation.
                 continue
-            # Note: Unable to apply injector on close method.
-            self.instances[basenote].close()
+            self.close_provider(basenote)
+        self.closed = True
+
+    def close_provider(self, basenote):
+        """Close the provider instance of basenote, calling hooks."""
+        # Note: Unable to apply injector on close method.
+        instance = self.instances[basenote]
+        hooks = self.hooks
+        if not hooks:
+            instance.close()
+            return
+        start = timer()
+        instance.close()
+        seconds = timer() - start
+        if isinstance(instance, GeneratorProvider):
+            kind = GENERATOR
+        else:
+            kind = CLASS
+        for hook in hooks:
+            hook.on_close(self, basenote, kind, seconds)
+
+    def close_concurrently(self, max_workers, timeout):
+        """Implementation of `close` on threads, see `close`."""
+        basenotes = [basenote for basenote in reversed(self.get_order)
+                     if basenote in self.instances]
+        dependencies = type(self).graph().dependencies
+
+        # Providers which must be closed before each provider, and inversely.
+        blockers = dict((basenote, set()) for basenote in basenotes)
+        unblocks = collections.defaultdict(list)
+        for basenote in basenotes:
+            # Walk through dependencies without instances, e.g. factories.
+            seen, stack = set(), list(dependencies.get(basenote, ()))
+            while stack:
+                dependency = stack.pop()
+                if dependency in seen or dependency == basenote:
+                    continue
+                seen.add(dependency)
+                if dependency in blockers:
+                    blockers[dependency].add(basenote)
+                    unblocks[basenote].append(dependency)
+                else:
+                    stack.extend(dependencies.get(dependency, ()))
+
+        pending = set(basenotes)
+        ready = collections.deque(
+            basenote for basenote in basenotes if not blockers[basenote])
+        running = {}
+        finished = []
+        errors = collections.OrderedDict()
+        condition = threading.Condition()
+
+        def run(basenote):
+            error = None
+            try:
+                self.close_provider(basenote)
+            except Exception:
+                error = sys.exc_info()[1]
+            with condition:
+                finished.append((basenote, error))
+                condition.notify()
+
+        def done(basenote):
+            for dependency in unblocks[basenote]:
+                blockers[dependency].discard(basenote)
+                if not blockers[dependency] and dependency in pending:
+                    ready.append(dependency)
+
+        with condition:
+            while pending or running:
+                while ready and len(running) < max_workers:
+                    basenote = ready.popleft()
+                    pending.discard(basenote)
+                    if timeout is None:
+                        running[basenote] = None
+                    else:
+                        running[basenote] = timer() + timeout
+                    thread = threading.Thread(target=run, args=(basenote,))
+                    thread.daemon = True
+                    thread.start()
+                if not running:
+                    # Dependencies are cyclic; fall back to reverse get order.
+                    ready.append(next(
+                        basenote for basenote in basenotes
+                        if basenote in pending))
+                    continue
+                if not finished:
+                    deadlines = [deadline for deadline in running.values()
+                                 if deadline is not None]
+                    if not deadlines:
+                        condition.wait()
+                    elif min(deadlines) > timer():
+                        condition.wait(min(deadlines) - timer())
+                for basenote, error in finished:
+                    if basenote in running:
+                        del running[basenote]
+                        if error is not None:
+                            errors[basenote] = error
+                        done(basenote)
+                del finished[:]
+                now = timer()
+                for basenote, deadline in list(running.items()):
+                    if deadline is not None and deadline <= now:
+                        del running[basenote]
+                        msg = '{!r} did not close within {} seconds'
+                        errors[basenote] = CloseTimeoutError(
+                            msg.format(basenote, timeout))
+                        done(basenote)
         self.closed = True
+        if errors:
+            msg = '; '.join(
+                '{!r}: {!r}'.format(basenote, error)
+                for basenote, error in errors.items())
+            raise CloseError(msg, errors=errors)
+
+    def invalidate(self, note):
+        """Discard cached result of a named note, or all names of basenote.
+
+        Raises LookupError if the provider of note has no cache.
+        """
+        note = Note.of(note)
+        if note.basenote not in self.caches():
+            raise LookupError('{!r} has no cache'.format(note.basenote))
+        cache = self.named_caches.get(note.basenote)
+        if cache is not None:
+            cache.invalidate(note.name)
+
+    def reset(self):
+        """Close injector if not yet closed, then clear it for reuse.
+
+        Provided values, provider instances, get order and stats are cleared
+        in place, such that the injector can be used again as if new, without
+        rebuilding its internal structures. See also: `InjectorPool`.
+        """
+        if not self.closed:
+            self.close()
+        provide_self = self.values.get('injector') is self
+        if self.instances:
+            self.instances.clear()
+        self.values.clear()
+        if provide_self:
+            self.values['injector'] = self
+        self.get_order.clear()
+        self.stats.clear()
+        if self.instantiating:
+            self.instantiating.clear()
+        self.warmup_times = EMPTY_MAPPING
+        for cache in self.named_caches.values():
+            cache.clear()
+        self.closed = False
 
     def prepare_callable(self, fn, partial=False):
         """Prepare arguments required to apply function."""
-        notes, keyword_notes = self.get_annotations(fn)
-        return self.prepare_notes(*notes, __partial=partial, **keyword_notes)
-
-    def prepare_notes(self, *notes, **keyword_notes):
-        """Get injection values for all given notes."""
-        __partial = keyword_notes.pop('__partial', False)
-        args = tuple(self.get(note) for note in notes)
+        return self.prepare_plan(self.plan(fn, partial=partial))
+
+    def prepare_plan(self, plan):
+        """Get injection values for all steps of the given plan."""
+        get_step = self.get_step
+        if plan.bulk:
+            bulk = {}
+            for basenote, notes in plan.bulk:
+                bulk.update(zip(notes, self.get_names(basenote, notes)))
+
+            def get_step(step, get_step=get_step):
+                if step[0] in bulk:
+                    return bulk[step[0]]
+                return get_step(step)
+        args = tuple([get_step(step) for step in plan.args])
         kwargs = {}
-        for arg in keyword_notes:
-            note = keyword_notes[arg]
-            if isinstance(note, tuple) and len(note) == 2 and note[0] == MAYBE:
+        for arg, step, optional in plan.kwargs:
+            if optional:
                 try:
-                    kwargs[arg] = self.get(note[1])
-                except LookupError:
-                    continue
-            elif __partial:
-                try:
-                    kwargs[arg] = self.get(note)
+                    kwargs[arg] = get_step(step)
                 except LookupError:
                     continue
             else:
-                kwargs[arg] = self.get(note)
+                kwargs[arg] = get_step(step)
         return args, kwargs
 
+    def prepare_notes(self, *notes, **keyword_notes):
+        """Get injection values for all given notes."""
+        __partial = keyword_notes.pop('__partial', False)
+        plan = self.plan_notes(notes, keyword_notes, partial=__partial)
+        return self.prepare_plan(plan)
+
     @classmethod
     def parse_note(cls, note):
         """Parse string annotation into object reference with optional name."""
-        if isinstance(note, tuple):
-            if len(note) != 2:
-                raise ValueError('tuple annotations must be length 2')
-            return note
-        try:
-            match = cls.re_note.match(note)
-        except TypeError:
-            # Note is not a string. Support any Python object as a note.
-            return note, None
-        return match.groups()
+        return Note.of(note).key
 
-    def handle_provider(self, provider_or_fn, note):
-        """Get value from provider as requested by note."""
+    def handle_provider(self, provider_or_fn, note, names=None):
+        """Get value from provider as requested by note, or values by names."""
         # Implementation in separate method to support accurate book-keeping.
-        basenote, name = self.parse_note(note)
-        result = self._handle_provider(provider_or_fn, note, basenote, name)
+        note = Note.of(note)
+        basenote, name = note.key
+        if names is None:
+            result = self._handle_provider(
+                provider_or_fn, note.note, basenote, name)
+        else:
+            result = self._handle_provider_many(
+                provider_or_fn, note.note, basenote, names)
         if basenote not in self.get_order:
-            self.get_order.append(basenote)
+            if self.threadsafe:
+                with self.lock:
+                    self.get_order[basenote] = None
+            else:
+                self.get_order[basenote] = None
         return result
 
     def _handle_provider(self, provider_or_fn, note, basenote, name):
-        if basenote in self.instances:
-            provider_or_fn = self.instances[basenote]
-        elif inspect.isclass(provider_or_fn):
-            # Inject class __init__, if annotated.
-            cls = provider_or_fn
-            if hasattr(cls, '__init__') and self.has_annotations(cls.__init__):
-                args, kwargs = self.prepare_callable(cls.__init__)
-                provider_or_fn = provider_or_fn(*args, **kwargs)
-            else:
-                provider_or_fn = provider_or_fn()
-            self.instances[basenote] = provider_or_fn
-        elif inspect.isgeneratorfunction(provider_or_fn):
-            provider_or_fn, value = self.init_generator(provider_or_fn)
-            self.instances[basenote] = provider_or_fn
-            self.values[basenote] = value
-            if name is None:
-                return value
+        provider = provider_or_fn
+        provider_or_fn = self.instantiate(provider_or_fn, note, basenote)
+        if name is None and basenote in self.values:
+            # Generator was initialized, providing its value.
+            return self.values[basenote]
+        lifetime = self.lifetimes().get(basenote) if name is None else None
+        if lifetime == SINGLETON:
+            return self.get_singleton_value(provider, note, basenote)
+        value = self.call_provider(provider_or_fn, note, name)
+        if name is None:
+            if lifetime != TRANSIENT:
+                self.values[basenote] = value
+        else:
+            cache = self.named_cache(basenote)
+            if cache is not None:
+                cache.set(name, value)
+        return value
+
+    def named_cache(self, basenote):
+        """Get cache of results by name of basenote, or None if uncached.
+
+        Caches are created on first use, such that injectors (children in
+        particular) only hold caches of the providers they call by name.
+        """
+        cache = self.named_caches.get(basenote)
+        if cache is not None:
+            return cache
+        template = self.caches().get(basenote)
+        if template is None:
+            return None
+        if self.threadsafe:
+            with self.lock:
+                return self.create_named_cache(basenote, template)
+        return self.create_named_cache(basenote, template)
+
+    def create_named_cache(self, basenote, template):
+        """Implementation to create a cache, see `named_cache`."""
+        if self.named_caches is EMPTY_MAPPING:
+            self.named_caches = {}
+        cache = self.named_caches.get(basenote)
+        if cache is None:
+            cache = self.named_caches[basenote] = template.empty()
+        return cache
+
+    def call_provider(self, provider_or_fn, note, name):
+        """Get value of note from provider instance or factory."""
         if hasattr(provider_or_fn, 'get'):
             fn = provider_or_fn.get
         else:
@@ -702,47 +2396,819 @@ class Injector(object):
             fn = self.partial(fn)
         try:
             if name is None:
-                value = fn()
-                self.values[basenote] = value
-                return value
+                return fn()
             return fn(name=name)
         except UnsetError:
-            # Use sys.exc_info to support both Python 2 and Python 3.
-            exc_type, exc_value, tb = sys.exc_info()
-            exc_msg = str(exc_value)
-            if exc_msg:
-                msg = '{}: {!r}'.format(exc_msg, note)
+            self.reraise_unset(note)
+
+    def get_singleton_value(self, provider_or_fn, note, basenote):
+        """Get value of singleton basenote, shared by injectors of class."""
+        owner = self.singleton_owner(basenote)
+        with owner.singleton_locks[basenote]:
+            instance = self.instantiate_singleton(
+                provider_or_fn, note, basenote)
+            record = owner.singletons[basenote]
+            if record[2] is MISSING:
+                record[2] = self.call_provider(instance, note, None)
+        self.values[basenote] = record[2]
+        return record[2]
+
+    def _handle_provider_many(self, provider_or_fn, note, basenote, names):
+        cache = self.named_cache(basenote)
+        if cache is None:
+            return self.get_names_uncached(
+                provider_or_fn, note, basenote, names)
+        values = [cache.get(name, MISSING) for name in names]
+        missing = tuple(name for name, value in zip(names, values)
+                        if value is MISSING)
+        if missing:
+            fetched = iter(self.get_names_uncached(
+                provider_or_fn, note, basenote, missing))
+            for index, value in enumerate(values):
+                if value is MISSING:
+                    values[index] = value = next(fetched)
+                    cache.set(names[index], value)
+        return values
+
+    def get_names_uncached(self, provider_or_fn, note, basenote, names):
+        """Implementation to get values by names from provider in bulk."""
+        provider_or_fn = self.instantiate(provider_or_fn, note, basenote)
+        get_many = getattr(provider_or_fn, 'get_many', None)
+        if getattr(get_many, '__func__', None) is vars(Provider)['get_many']:
+            # Default implementation; fall back here to support annotations.
+            get_many = None
+        try:
+            if get_many is not None:
+                if self.has_annotations(get_many):
+                    get_many = self.partial(get_many)
+                values = list(get_many(names))
             else:
-                msg = repr(note)
-            six.reraise(exc_type, exc_type(msg, note=note), tb)
+                if hasattr(provider_or_fn, 'get'):
+                    fn = provider_or_fn.get
+                else:
+                    fn = provider_or_fn
+                if self.has_annotations(fn):
+                    fn = self.partial(fn)
+                values = [fn(name=name) for name in names]
+        except UnsetError:
+            self.reraise_unset(note)
+        if len(values) != len(names):
+            msg = '{!r} got {} values for {} names: {!r}'
+            raise ValueError(
+                msg.format(get_many, len(values), len(names), names))
+        return values
+
+    def reraise_unset(self, note):
+        """Re-raise current UnsetError with note in its message."""
+        # Use sys.exc_info to support both Python 2 and Python 3.
+        exc_type, exc_value, tb = sys.exc_info()
+        exc_msg = str(exc_value)
+        if exc_msg:
+            msg = '{}: {!r}'.format(exc_msg, note)
+        else:
+            msg = repr(note)
+        reraise(exc_type, exc_type(msg, note=note), tb)
+
+    def instantiate(self, provider_or_fn, note, basenote):
+        """Get the provider instance of basenote, instantiating as needed.
+
+        Provider classes are instantiated and generators initialized once,
+        whereas factories are returned as-is. Instances of singletons are
+        shared by injectors of the class, see `instantiate_singleton`.
+        """
+        if basenote in self.instances:
+            return self.instances[basenote]
+        if not isclass(provider_or_fn) and \
+                not isgeneratorfunction(provider_or_fn):
+            return provider_or_fn
+        if self.lifetimes().get(basenote) == SINGLETON:
+            return self.instantiate_singleton(provider_or_fn, note, basenote)
+        instance, value = self.build_instance(provider_or_fn, note)
+        self.keep_instance(basenote, instance)
+        if value is not MISSING:
+            self.values[basenote] = value
+        return instance
+
+    def keep_instance(self, basenote, instance):
+        """Keep provider instance of basenote, see `instances`."""
+        if self.instances is EMPTY_MAPPING:
+            self.instances = {}
+        self.instances[basenote] = instance
+
+    def build_instance(self, provider_or_fn, note):
+        """Instantiate Provider class or initialize generator of note.
+
+        Returns (instance, value), where value is the first value of a
+        generator, else `MISSING`.
+        """
+        start = timer() if self.hooks else None
+        if isclass(provider_or_fn):
+            # Inject class __init__, if annotated.
+            cls = provider_or_fn
+            if hasattr(cls, '__init__') and self.has_annotations(cls.__init__):
+                args, kwargs = self.prepare_callable(cls.__init__)
+                instance = provider_or_fn(*args, **kwargs)
+            else:
+                instance = provider_or_fn()
+            kind, value = CLASS, MISSING
+        else:
+            instance, value = self.init_generator(provider_or_fn)
+            kind = GENERATOR
+        if start is not None:
+            self.call_instantiate_hooks(note, kind, timer() - start)
+        return instance, value
+
+    def instantiate_singleton(self, provider_or_fn, note, basenote):
+        """Get the shared provider instance of a singleton basenote.
+
+        Singletons are kept on the class which registers the provider, see
+        `singleton_owner`, as basenote -> [provider, instance or None for
+        factories, value or `MISSING`, process id], and rebuilt when the
+        registered provider changes. The injector keeps a reference to the
+        value, but not the instance, such that it does not close it. Each
+        singleton is built under its own lock, which is reentrant.
+        """
+        owner = self.singleton_owner(basenote)
+        with owner.singleton_locks[basenote]:
+            singletons = owner.singletons
+            record = singletons.get(basenote)
+            if record is None or record[0] is not provider_or_fn:
+                self.check_singleton(basenote)
+                instance, value = None, MISSING
+                if isclass(provider_or_fn) or \
+                        isgeneratorfunction(provider_or_fn):
+                    instance, value = self.build_instance(provider_or_fn, note)
+                record = singletons[basenote] = [
+                    provider_or_fn, instance, value, os.getpid()]
+        if record[2] is not MISSING:
+            self.values[basenote] = record[2]
+        return provider_or_fn if record[1] is None else record[1]
+
+    def check_singleton(self, basenote):
+        """Raise ValueError if singleton basenote has captive dependencies.
+
+        A singleton would otherwise keep values of providers which the
+        injector building it closes, see `Graph.captive`.
+        """
+        for singleton, dependency in type(self).graph().captive:
+            if singleton == basenote:
+                raise ValueError(captive_message(singleton, dependency))
+
+    def call_instantiate_hooks(self, note, kind, seconds):
+        """Call `Hook.on_instantiate` of each hook."""
+        note = Note.of(note)
+        for hook in self.hooks:
+            hook.on_instantiate(self, note, kind, seconds)
 
     @classmethod
-    def register(cls, note, provider):
+    def register(cls, note, provider, cache=None, fork_safe=True,
+                 lifetime=SCOPED):
         """Implementation to register provider via `provider` & `factory`."""
-        basenote, name = cls.parse_note(note)
+        basenote = Note.of(note).basenote
+        if lifetime not in LIFETIMES:
+            msg = 'lifetime must be one of {!r}, not {!r}'
+            raise ValueError(msg.format(LIFETIMES, lifetime))
+        if lifetime == TRANSIENT and isgeneratorfunction(provider):
+            msg = 'generator {!r} cannot be transient'
+            raise ValueError(msg.format(provider))
+        if lifetime == PER_NAME and cache is None:
+            cache = LRU(maxsize=None)
         if 'provider_registry' not in vars(cls):
-            cls.provider_registry = {}
+            cls.provider_registry = ordered_dict()
         cls.provider_registry[basenote] = provider
+        if cache is not None:
+            if 'cache_registry' not in vars(cls):
+                cls.cache_registry = {}
+            cls.cache_registry[basenote] = cache
+        elif basenote in vars(cls).get('cache_registry', ()):
+            del cls.cache_registry[basenote]
+        if not fork_safe:
+            if 'fork_unsafe_registry' not in vars(cls):
+                cls.fork_unsafe_registry = set()
+            cls.fork_unsafe_registry.add(basenote)
+        elif basenote in vars(cls).get('fork_unsafe_registry', ()):
+            cls.fork_unsafe_registry.discard(basenote)
+        if lifetime != SCOPED:
+            if 'lifetime_registry' not in vars(cls):
+                cls.lifetime_registry = {}
+            cls.lifetime_registry[basenote] = lifetime
+        elif basenote in vars(cls).get('lifetime_registry', ()):
+            del cls.lifetime_registry[basenote]
+        cls.bump_registry_version()
+
+    @classmethod
+    def bump_registry_version(cls):
+        """Invalidate registry & plans of this class and its subclasses."""
+        for c in cls.class_tree():
+            c.registry_version = c.registry_version + 1
+            if 'registry_cache' in vars(c):
+                del c.registry_cache
+            if 'scope_cache' in vars(c):
+                del c.scope_cache
+            if 'caches_cache' in vars(c):
+                del c.caches_cache
+            if 'fork_cache' in vars(c):
+                del c.fork_cache
+            if 'graph_cache' in vars(c):
+                del c.graph_cache
+            if 'lifetimes_cache' in vars(c):
+                del c.lifetimes_cache
+
+    @classmethod
+    def class_tree(cls):
+        """Get list of this class and all of its subclasses."""
+        tree, classes = [], [cls]
+        while classes:
+            c = classes.pop()
+            tree.append(c)
+            classes.extend(c.__subclasses__())
+        return tree
 
     @classmethod
     def lookup(cls, basenote):
-        """Look up note in registered annotations, walking class tree."""
-        # Walk method resolution order, which includes current class.
-        for c in cls.mro():
+        """Look up note in registered annotations, see `registry`."""
+        registry = vars(cls).get('registry_cache')
+        if registry is None:
+            registry = cls.registry()
+        try:
+            return registry[basenote]
+        except KeyError:
+            raise LookupError(repr(basenote))
+
+    @classmethod
+    def registry(cls):
+        """Get flattened note -> provider map of this class and its bases.
+
+        The map is built once by walking the class tree and cached on the
+        class until `register` is called on the class or any of its bases.
+        Treat the result as read-only.
+        """
+        registry = vars(cls).get('registry_cache')
+        if registry is not None:
+            return registry
+        # Ordered in order of registration, for a deterministic `graph`.
+        registry = ordered_dict()
+        # Walk method resolution order, base classes first to be overridden.
+        for c in reversed(cls.mro()):
             if 'provider_registry' not in vars(c):
                 # class is a mixin, super to base class, or never registered.
                 continue
-            if basenote in c.provider_registry:
-                # note is in the registry.
-                return c.provider_registry[basenote]
-        raise LookupError(repr(basenote))
+            registry.update(c.provider_registry)
+        cls.registry_cache = registry
+        return registry
+
+    @classmethod
+    def caches(cls):
+        """Get flattened basenote -> cache template map, see `provider`.
+
+        Cached on the class like `registry`. Treat the result as read-only.
+        """
+        caches = vars(cls).get('caches_cache')
+        if caches is not None:
+            return caches
+        caches = {}
+        for c in reversed(cls.mro()):
+            cache_registry = vars(c).get('cache_registry', {})
+            for basenote in vars(c).get('provider_registry', ()):
+                caches[basenote] = cache_registry.get(basenote)
+        caches = dict(
+            (basenote, cache) for basenote, cache in caches.items()
+            if cache is not None)
+        cls.caches_cache = caches
+        return caches
+
+    @classmethod
+    def lifetimes(cls):
+        """Get flattened basenote -> lifetime map, of lifetimes not scoped.
+
+        Cached on the class like `registry`. Treat the result as read-only.
+        """
+        lifetimes = vars(cls).get('lifetimes_cache')
+        if lifetimes is not None:
+            return lifetimes
+        lifetimes = {}
+        for c in reversed(cls.mro()):
+            lifetime_registry = vars(c).get('lifetime_registry', {})
+            for basenote in vars(c).get('provider_registry', ()):
+                lifetimes[basenote] = lifetime_registry.get(basenote, SCOPED)
+        lifetimes = dict(
+            (basenote, lifetime) for basenote, lifetime in lifetimes.items()
+            if lifetime != SCOPED)
+        cls.lifetimes_cache = lifetimes
+        return lifetimes
+
+    @classmethod
+    def singleton_owner(cls, basenote):
+        """Get the class which registers the provider of singleton basenote.
+
+        Singletons are kept on that class, in `singletons` with a lock per
+        basenote in `singleton_locks`, created as needed. Injectors of the
+        class and of its subclasses which inherit the provider share one
+        instance; such subclasses should not override its dependencies.
+        """
+        for owner in cls.mro():
+            if basenote in vars(owner).get('provider_registry', ()):
+                break
+        else:
+            raise LookupError(repr(basenote))
+        locks = vars(owner).get('singleton_locks')
+        if locks is None or basenote not in locks:
+            with singleton_lock:
+                if 'singleton_locks' not in vars(owner):
+                    owner.singletons = ordered_dict()
+                    owner.singleton_locks = {}
+                    owner.singleton_pid = os.getpid()
+                owner.singleton_locks.setdefault(basenote, threading.RLock())
+        return owner
+
+    @classmethod
+    def close_singletons(cls):
+        """Close singleton providers of this class and its subclasses.
+
+        Singletons are closed, e.g. on process exit, those of subclasses
+        first, each class in the reverse order in which they were provided,
+        and are provided anew on next get. Errors are collected until all
+        are closed, then raised as `CloseError`. See `provider`.
+        """
+        closing = []
+        with singleton_lock:
+            for c in reversed(cls.class_tree()):
+                singletons = vars(c).get('singletons')
+                if singletons:
+                    c.singletons = ordered_dict()
+                    closing.extend(
+                        (basenote, singletons[basenote][1])
+                        for basenote in reversed(list(singletons)))
+        errors = collections.OrderedDict()
+        for basenote, instance in closing:
+            if instance is None:
+                # Factory; no close implementation.
+                continue
+            try:
+                instance.close()
+            except Exception:
+                errors[basenote] = sys.exc_info()[1]
+        if errors:
+            msg = '; '.join(
+                '{!r}: {!r}'.format(basenote, error)
+                for basenote, error in errors.items())
+            raise CloseError(msg, errors=errors)
+
+    @classmethod
+    def fork_unsafe(cls):
+        """Get frozenset of basenotes registered with ``fork_safe=False``.
+
+        Includes their `dependents`, since their values are built from state
+        of the parent process. Cached on the class like `registry`.
+        """
+        unsafe = vars(cls).get('fork_cache')
+        if unsafe is not None:
+            return unsafe
+        flags = {}
+        for c in reversed(cls.mro()):
+            fork_unsafe_registry = vars(c).get('fork_unsafe_registry', ())
+            for basenote in vars(c).get('provider_registry', ()):
+                flags[basenote] = basenote in fork_unsafe_registry
+        unsafe = [basenote for basenote, flag in flags.items() if flag]
+        if unsafe:
+            unsafe = cls.dependents(unsafe)
+        unsafe = cls.fork_cache = frozenset(unsafe)
+        return unsafe
+
+    @classmethod
+    def dependents(cls, basenotes):
+        """Get set of basenotes and all which depend on them, per `graph`."""
+        dependents = collections.defaultdict(list)
+        for basenote, edges in cls.graph().dependencies.items():
+            for dependency in edges:
+                dependents[dependency].append(basenote)
+        result, stack = set(), list(basenotes)
+        while stack:
+            basenote = stack.pop()
+            if basenote not in result:
+                result.add(basenote)
+                stack.extend(dependents[basenote])
+        return result
+
+    @classmethod
+    def scoped_notes(cls, parent_class):
+        """Get basenotes provided by this class as child of parent class.
+
+        These are the notes registered on this class (or its bases) which the
+        parent class does not provide with the same provider. A child injector
+        gets all other notes from its parent. Cached until the registry of
+        either class changes.
+        """
+        cache = vars(cls).get('scope_cache')
+        if cache is None:
+            cache = cls.scope_cache = {}
+        cached = cache.get(parent_class)
+        if cached is not None and cached[0] == parent_class.registry_version:
+            return cached[1]
+        parent_registry = parent_class.registry()
+        registry = cls.registry()
+        notes = frozenset(
+            basenote for basenote in registry
+            if basenote not in parent_registry
+            or parent_registry[basenote] is not registry[basenote])
+        cache[parent_class] = (parent_class.registry_version, notes)
+        return notes
+
+    @classmethod
+    def graph(cls, entry_points=(), provided=()):
+        """Build the static dependency graph of all registered providers.
+
+        Dependencies are read from the annotations of Provider ``__init__``
+        and ``get``, generators and factories, without instantiating anything.
+        Annotated `entry_points` callables, e.g. handlers, are checked for
+        notes which cannot be resolved. Basenotes in `provided` are taken as
+        resolvable, e.g. the registry of the class of a parent injector.
+
+        Lazy partial notes are checked but do not count as dependencies, as
+        they are only resolved when called. Returns a `Graph`.
+
+        The graph of the registry is built once and cached on the class like
+        `registry`, such that `close`, `warmup` and `dependents` reuse its
+        topological order; treat it as read-only.
+        """
+        graph = vars(cls).get('graph_cache')
+        if graph is None:
+            graph = cls.graph_cache = cls.build_graph()
+        if not entry_points and not provided:
+            return graph
+        registry = cls.registry()
+        provided = frozenset(provided)
+        missing = [(dependent, note) for dependent, note in graph.missing
+                   if note.basenote not in provided]
+        for fn in entry_points:
+            for note, optional, lazy in cls.dependencies(fn):
+                if note.basenote not in registry and not optional \
+                        and note.basenote not in provided:
+                    missing.append((fn, note))
+        return Graph(graph.version, graph.dependencies, missing,
+                     order=graph.order, cycles=graph.cycles,
+                     captive=graph.captive)
+
+    @classmethod
+    def build_graph(cls):
+        """Implementation to build the dependency graph, see `graph`."""
+        registry = cls.registry()
+        dependencies = collections.OrderedDict()
+        missing = []
+        for basenote, provider in registry.items():
+            if isclass(provider):
+                fns = [getattr(provider, '__init__', None), provider.get]
+            else:
+                fns = [provider]
+            edges = []
+            for fn in fns:
+                for note, optional, lazy in cls.dependencies(fn):
+                    if note.basenote in registry:
+                        if not lazy and note.basenote not in edges:
+                            edges.append(note.basenote)
+                    elif not optional:
+                        missing.append((basenote, note))
+            dependencies[basenote] = tuple(edges)
+        lifetimes = cls.lifetimes()
+        captive = []
+        for basenote in dependencies:
+            if lifetimes.get(basenote) != SINGLETON:
+                continue
+            # Walk through factories, which are not closed.
+            seen, stack = set(), list(reversed(dependencies[basenote]))
+            while stack:
+                dependency = stack.pop()
+                if dependency in seen or \
+                        lifetimes.get(dependency) == SINGLETON:
+                    continue
+                seen.add(dependency)
+                provider = registry[dependency]
+                if isclass(provider) or isgeneratorfunction(provider):
+                    captive.append((basenote, dependency))
+                else:
+                    stack.extend(reversed(dependencies[dependency]))
+        return Graph(cls.registry_version, dependencies, missing,
+                     captive=captive)
+
+    @classmethod
+    def dependencies(cls, fn, partial=False):
+        """Get notes annotated on callable, each (`Note`, optional, lazy).
+
+        Notes of partial notes are included, as `optional` where `partial`
+        would skip them and `lazy` where resolved only when called.
+        """
+        if fn is None or not cls.annotator_class.has_annotations(fn):
+            return []
+        notes, keyword_notes = cls.annotator_class.get_annotations(fn)
+        result = []
+        items = [(note, False) for note in notes]
+        items.extend((keyword_notes[arg], partial) for arg in keyword_notes)
+        for note, optional in items:
+            note = Note.of(note)
+            if note.kind == MAYBE:
+                note, optional = note.inner, True
+            if note.kind in PARTIAL_KINDS:
+                lazy = note.kind in (PARTIAL, PARTIAL_REGARDLESS)
+                for inner in cls.dependencies(note.inner[0], partial=True):
+                    result.append(
+                        (inner[0], optional or inner[1], lazy or inner[2]))
+                continue
+            result.append((note, optional, False))
+        return result
+
+    @classmethod
+    def validate(cls, entry_points=(), provided=()):
+        """Check the dependency graph at startup, see `graph`.
+
+        Raises `DependencyCycleError` if providers depend on themselves,
+        else LookupError if notes cannot be resolved, else ValueError if
+        singletons depend on providers closed with an injector, listing all
+        problems. Otherwise returns the `Graph`, whose `order` is suited for
+        warm-up.
+
+        Once validated, and until the registry changes, injectors of this
+        class skip their runtime dependency cycle checks. The graph only has
+        the dependencies which are annotated, whereas providers which get
+        notes from the injector itself, e.g. through an `InjectorProxy`, can
+        still form a cycle. Injectors which provide 'injector' (see
+        `__init__`) therefore keep checking.
+        """
+        graph = cls.graph(entry_points=entry_points, provided=provided)
+        if graph.cycles:
+            notes = tuple((basenote, None) for basenote in graph.cycles[0])
+            raise DependencyCycleError('; '.join(graph.errors()), notes=notes)
+        elif graph.missing:
+            raise LookupError('; '.join(graph.errors()))
+        elif graph.captive:
+            raise ValueError('; '.join(graph.errors()))
+        cls.validated_version = graph.version
+        return graph
+
+    @hybridmethod
+    def warmup(self, notes=None, max_workers=4):
+        """Instantiate providers ahead of the first request, returning self.
+
+        Providers of given notes, by default of all registered notes, are
+        instantiated along with their dependencies in the topological order
+        of `graph`: Provider classes are instantiated and generators
+        initialized, see `warm`. Providers are not asked for a value, which
+        may need a name, and factories are not called. On a thread-safe
+        injector, independent branches of the graph are provided concurrently
+        by up to `max_workers` threads; otherwise providers are provided one
+        after another::
+
+            injector = Injector(threadsafe=True).warmup()
+
+        Called on the class, creates and warms up a thread-safe injector::
+
+            injector = Injector.warmup()
+
+        Seconds to instantiate each provider are recorded in `warmup_times`.
+        Notes which are unset are skipped. On error, no further providers are
+        started, and `WarmupError` is raised with the errors of all providers
+        which failed, once those which are running are done.
+        """
+        if isclass(self):
+            self = self(threadsafe=True)
+        graph = type(self).graph()
+        if graph.cycles:
+            cycle = graph.cycles[0]
+            raise DependencyCycleError(
+                graph.errors()[0],
+                notes=tuple((basenote, None) for basenote in cycle))
+        order = graph.order
+        if notes is not None:
+            basenotes = [Note.of(note).basenote for note in notes]
+            wanted, stack = set(), list(basenotes)
+            while stack:
+                basenote = stack.pop()
+                if basenote not in wanted:
+                    wanted.add(basenote)
+                    stack.extend(graph.dependencies.get(basenote, ()))
+            order = [basenote for basenote in order if basenote in wanted]
+            # Let `warm` raise on notes which are not registered.
+            order.extend(basenote for basenote in basenotes
+                         if basenote not in graph.dependencies)
+
+        if self.warmup_times is EMPTY_MAPPING:
+            self.warmup_times = ordered_dict()
+        pending, dependents = {}, collections.defaultdict(list)
+        for basenote in order:
+            pending[basenote] = set(graph.dependencies.get(basenote, ()))
+            pending[basenote].intersection_update(order)
+            for dependency in pending[basenote]:
+                dependents[dependency].append(basenote)
+        ready = collections.deque(
+            basenote for basenote in order if not pending[basenote])
+        errors = collections.OrderedDict()
+        condition = threading.Condition()
+        running = [0]
+
+        def work():
+            while True:
+                with condition:
+                    while not ready and running[0] and not errors:
+                        condition.wait()
+                    if errors or not ready:
+                        condition.notify_all()
+                        return
+                    basenote = ready.popleft()
+                    running[0] += 1
+                start, error, unset, warmed = timer(), None, False, False
+                try:
+                    warmed = self.warm(basenote)
+                except UnsetError:
+                    unset = True
+                except Exception:
+                    error = sys.exc_info()[1]
+                seconds = timer() - start
+                with condition:
+                    running[0] -= 1
+                    if error is not None:
+                        errors[basenote] = error
+                    else:
+                        if warmed and not unset:
+                            self.warmup_times[basenote] = seconds
+                        for dependent in dependents[basenote]:
+                            pending[dependent].discard(basenote)
+                            if not pending[dependent]:
+                                ready.append(dependent)
+                    condition.notify_all()
+
+        workers = min(max_workers if self.threadsafe else 1, len(order))
+        threads = [threading.Thread(target=work) for _ in range(workers - 1)]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        work()
+        for thread in threads:
+            thread.join()
+        if errors:
+            msg = '; '.join(
+                '{!r}: {!r}'.format(basenote, error)
+                for basenote, error in errors.items())
+            raise WarmupError(msg, errors=errors)
+        return self
+
+    def warm(self, basenote):
+        """Instantiate provider of basenote for `warmup`, without a value.
+
+        Returns True if a Provider class was instantiated or a generator
+        initialized, now or before, and False for factories. Raises
+        LookupError if basenote is not registered.
+        """
+        if self.parent is not None and basenote not in self.scoped:
+            return self.parent.warm(basenote)
+        provider_or_fn = self.lookup(basenote)
+        if not isclass(provider_or_fn) and \
+                not isgeneratorfunction(provider_or_fn):
+            return False
+        if self.threadsafe:
+            with self.basenote_lock(basenote):
+                self.instantiate(provider_or_fn, basenote, basenote)
+                with self.lock:
+                    self.get_order.setdefault(basenote, None)
+        else:
+            self.instantiate(provider_or_fn, basenote, basenote)
+            self.get_order.setdefault(basenote, None)
+        return True
+
+    @hybridmethod
+    def preload(self, notes=None, max_workers=4):
+        """Warm up providers in a parent process before fork, returning self.
+
+        For prefork servers: providers are built once in the parent, and
+        children share them copy-on-write. Providers which are not
+        fork-safe, and those which depend on them, are skipped, to be built by
+        each child on first use. See `provider` and `after_fork`::
+
+            injector = Injector.preload()
+            # ... fork workers, then in each child:
+            injector.after_fork()
+
+        Otherwise as `warmup`. On Python 3.7+, objects built so far are then
+        moved out of reach of the garbage collector with `gc.freeze`, such
+        that collections in children do not copy their memory pages.
+        """
+        if isclass(self):
+            self = self(threadsafe=True)
+        unsafe = type(self).fork_unsafe()
+        if notes is None:
+            notes = type(self).registry()
+        notes = [note for note in notes
+                 if Note.of(note).basenote not in unsafe]
+        self.warmup(notes, max_workers=max_workers)
+        if hasattr(gc, 'freeze'):
+            gc.collect()
+            gc.freeze()
+        return self
+
+    def after_fork(self):
+        """Prepare an injector inherited from a parent process, returning self.
+
+        Call in each child process right after fork, e.g. in the post-fork
+        hook of a prefork server, or register it with
+        ``os.register_at_fork(after_in_child=injector.after_fork)``.
+
+        Locks are replaced, since the parent may have held them on fork.
+        Providers which are not fork-safe (see `fork_unsafe`) are discarded
+        along with their values, to be built again on next use. Other provider
+        instances which implement `Provider.after_fork` have it called, and
+        their values, as well as the providers which depend on them, are
+        provided again on next use. Discarded instances are kept in
+        `abandoned` without being closed, since closing them (or letting them
+        be garbage collected) could act on resources of the parent.
+        Singletons are treated the same, once per process, see
+        `singleton_after_fork`.
+        """
+        if self.threadsafe:
+            self.lock = threading.Lock()
+            self.locks = {}
+            self.local = threading.local()
+        if self.instantiating:
+            self.instantiating.clear()
+        for cache in self.named_caches.values():
+            if hasattr(cache, 'after_fork'):
+                cache.after_fork()
+
+        # Providers to build again, and providers to only get again.
+        rebuild = set(type(self).fork_unsafe())
+        reget = set()
+        default = getattr(Provider.after_fork, '__func__', Provider.after_fork)
+        lifetimes = type(self).lifetimes()
+        for basenote in list(self.get_order):
+            if lifetimes.get(basenote) == SINGLETON:
+                if self.singleton_after_fork(basenote, basenote in rebuild):
+                    reget.add(basenote)
+                    rebuild.update(
+                        type(self).dependents([basenote]) - set([basenote]))
+                continue
+            instance = self.instances.get(basenote)
+            after_fork = getattr(instance, 'after_fork', None)
+            if basenote in rebuild or after_fork is None or \
+                    getattr(after_fork, '__func__', after_fork) is default:
+                continue
+            after_fork()
+            reget.add(basenote)
+            rebuild.update(type(self).dependents([basenote]) - set([basenote]))
+
+        for basenote in list(self.get_order):
+            if basenote in rebuild:
+                if basenote in self.instances:
+                    if not self.abandoned:
+                        self.abandoned = []
+                    self.abandoned.append(self.instances.pop(basenote))
+                del self.get_order[basenote]
+            elif basenote not in reget:
+                continue
+            self.values.pop(basenote, None)
+            if basenote in self.named_caches:
+                self.named_caches[basenote].invalidate()
+        return self
+
+    def singleton_after_fork(self, basenote, rebuild):
+        """Prepare singleton of basenote after fork, see `after_fork`.
+
+        Singletons are shared, so each is prepared once per process, by the
+        first injector to get here: its class gets new locks, and the
+        singleton is discarded to `abandoned` if it is to be rebuilt, else
+        has `Provider.after_fork` called, if implemented. Returns True if the
+        value of this injector is to be provided again.
+        """
+        pid = os.getpid()
+        owner = self.singleton_owner(basenote)
+        if owner.singleton_pid != pid:
+            owner.singleton_pid = pid
+            owner.singleton_locks = dict(
+                (key, threading.RLock()) for key in owner.singleton_locks)
+        record = owner.singletons.get(basenote)
+        if record is not None and record[3] != pid:
+            instance = record[1]
+            if rebuild:
+                del owner.singletons[basenote]
+                if instance is not None:
+                    if not self.abandoned:
+                        self.abandoned = []
+                    self.abandoned.append(instance)
+                return False
+            record[3] = pid
+            after_fork = getattr(instance, 'after_fork', None)
+            default = getattr(
+                Provider.after_fork, '__func__', Provider.after_fork)
+            if after_fork is not None and \
+                    getattr(after_fork, '__func__', after_fork) is not default:
+                after_fork()
+                record[2] = MISSING
+        if rebuild:
+            return False
+        return record is None or \
+            record[2] is not self.values.get(basenote, MISSING)
 
     def init_generator(self, fn):
         """Implementation to initialize generator providers."""
         provider = self.generator_provider(fn, support_name=fn.support_name)
         if self.has_annotations(provider.function):
-            notes, keyword_notes = self.get_annotations(provider.function)
-            args, kwargs = self.prepare_notes(*notes, **keyword_notes)
+            args, kwargs = self.prepare_callable(provider.function)
             value = provider.init(*args, **kwargs)
         else:
             value = provider.init()
@@ -769,11 +3235,83 @@ class Injector(object):
 
     @see_doc(Annotator.get_annotations)
     def get_annotations(self, *a, **kw):
-        return self.annotator.get_annotations(*a, **kw)
+        return self.annotator_class.get_annotations(*a, **kw)
 
     @see_doc(Annotator.has_annotations)
     def has_annotations(self, *a, **kw):
-        return self.annotator.has_annotations(*a, **kw)
+        return self.annotator_class.has_annotations(*a, **kw)
+
+    @property
+    def annotator(self):
+        """Instance of `annotator_class`, which is stateless and shared."""
+        cls = type(self)
+        annotator = vars(cls).get('annotator_cache')
+        if type(annotator) is not cls.annotator_class:
+            annotator = cls.annotator_cache = cls.annotator_class()
+        return annotator
+
+
+class InjectorPool(object):
+    """Reuse injectors, for servers which use an injector per request.
+
+    Creating an injector for each request and discarding it after close
+    churns allocations. A pool hands out idle injectors instead, and resets
+    them when given back::
+
+        from jeni import InjectorPool
+
+        pool = InjectorPool(Injector)
+        with pool.injector() as injector:
+            injector.apply(handler)
+
+    The factory is any callable which returns a new injector, e.g. an
+    injector class or the `child` method of an application injector. The
+    pool keeps up to `size` idle injectors. With `prewarm`, a background
+    thread fills the pool up front, see `prewarm`.
+    """
+
+    def __init__(self, factory, size=16, prewarm=False):
+        self.factory = factory
+        self.size = size
+        self.idle = collections.deque()
+
+        #: Background thread filling the pool, if `prewarm` was requested.
+        self.prewarm_thread = None
+        if prewarm:
+            self.prewarm_thread = threading.Thread(target=self.prewarm)
+            self.prewarm_thread.daemon = True
+            self.prewarm_thread.start()
+
+    def prewarm(self):
+        """Create injectors until the pool holds `size` idle injectors."""
+        while len(self.idle) < self.size:
+            self.idle.append(self.factory())
+
+    def acquire(self):
+        """Get an idle injector, creating one if the pool is empty."""
+        try:
+            return self.idle.pop()
+        except IndexError:
+            return self.factory()
+
+    def release(self, injector):
+        """Reset injector and keep it for reuse, if the pool has room.
+
+        An injector which fails to reset, e.g. a provider raises on close, is
+        not reused and the error is raised.
+        """
+        injector.reset()
+        if len(self.idle) < self.size:
+            self.idle.append(injector)
+
+    @contextlib.contextmanager
+    def injector(self):
+        """Context manager to acquire an injector and release it on exit."""
+        injector = self.acquire()
+        try:
+            yield injector
+        finally:
+            self.release(injector)
 
 
 class InjectorProxy(object):
@@ -791,7 +3329,7 @@ class InjectorProxy(object):
     """
 
     def __init__(self, injector):
-        if inspect.isclass(injector):
+        if isclass(injector):
             msg = 'takes an instance not a class, {!r}'
             raise TypeError(msg.format(injector))
         self.injector = injector
@@ -811,9 +3349,21 @@ class InjectorProxy(object):
 
 
 def class_in_progress(stack=None):
-    """True if currently inside a class definition, else False."""
+    """True if currently inside a class definition, else False.
+
+    Walks the frames of the call stack, in which a class body is a frame
+    with its own namespace which has ``__module__`` set. A `stack` as given
+    by ``inspect.stack()`` is checked for class statements instead.
+    """
     if stack is None:
-        stack = inspect.stack()
+        frame = sys._getframe(1)
+        while frame is not None:
+            if (not frame.f_code.co_flags & CO_OPTIMIZED
+                    and frame.f_locals is not frame.f_globals
+                    and '__module__' in frame.f_locals):
+                return True
+            frame = frame.f_back
+        return False
     for frame in stack:
         statement_list = frame[4]
         if statement_list is None:
@@ -823,6 +3373,103 @@ def class_in_progress(stack=None):
     return False
 
 
+def captive_message(singleton, basenote):
+    """Describe a captive dependency of a singleton, see `Graph.captive`."""
+    msg = ('Singleton {!r} depends on {!r}, which is closed with its '
+           'injector; register it as a singleton too')
+    return msg.format(singleton, basenote)
+
+
+def iter_apply(fn, iterable, batch=None):
+    """Call fn with each item, or list of `batch` items, see `iapply`."""
+    items = iter(iterable)
+    try:
+        if batch is None:
+            for item in items:
+                yield fn(item)
+        else:
+            chunks = iter(lambda: list(itertools.islice(items, batch)), [])
+            for chunk in chunks:
+                yield fn(chunk)
+    finally:
+        close = getattr(items, 'close', None)
+        if close is not None:
+            close()
+
+
+#: Injector and prepared callable of a process pool worker, see `imap`.
+pool_worker = {}
+
+
+def init_pool_worker(injector_class, fn, kw):
+    """Prepare callable in a process pool worker, see `Injector.imap`."""
+    from multiprocessing.util import Finalize
+    try:
+        injector = injector_class(**kw)
+        pool_worker['injector'] = injector
+        # Close the injector when the worker exits, after its last chunk.
+        Finalize(injector, injector.close, exitpriority=10)
+        args, kwargs = injector.prepare_callable(fn)
+        pool_worker['fn'] = functools.partial(fn, *args, **kwargs)
+    except Exception:
+        # Report on each chunk; a failing initializer makes the pool respawn.
+        pool_worker['error'] = sys.exc_info()[1]
+
+
+def run_pool_chunk(chunk):
+    """Apply prepared callable to chunk of items, as (values, error)."""
+    if 'error' in pool_worker:
+        return None, pool_worker['error']
+    fn = pool_worker['fn']
+    try:
+        return [fn(item) for item in chunk], None
+    except Exception:
+        return None, sys.exc_info()[1]
+
+
+def qualified_name(obj):
+    """Get importable 'module:qualname' of object, or None if it has none."""
+    module = getattr(obj, '__module__', None)
+    name = getattr(obj, '__qualname__', None) or getattr(obj, '__name__', None)
+    if not module or not name or '<' in name:
+        return None
+    return '{}:{}'.format(module, name)
+
+
+def resolve_name(name):
+    """Get object of 'module:qualname' if its module is already imported."""
+    module, _, qualname = name.partition(':')
+    obj = sys.modules.get(module)
+    try:
+        for attr in qualname.split('.'):
+            obj = getattr(obj, attr)
+    except AttributeError:
+        return None
+    return getattr(obj, '__func__', obj)
+
+
+def isclass(obj):
+    """True if object is a class, as ``inspect.isclass``."""
+    return isinstance(obj, CLASS_TYPES)
+
+
+def isgeneratorfunction(obj):
+    """True if object is a generator function, as in the inspect module."""
+    if isinstance(obj, types.MethodType):
+        obj = obj.__func__
+    return (isinstance(obj, types.FunctionType)
+            and bool(obj.__code__.co_flags & CO_GENERATOR))
+
+
+def provider_kind(provider_or_fn):
+    """Kind of registered provider: `CLASS`, `GENERATOR` or `FACTORY`."""
+    if isclass(provider_or_fn):
+        return CLASS
+    elif isgeneratorfunction(provider_or_fn):
+        return GENERATOR
+    return FACTORY
+
+
 def is_callable(obj):
     """True if object is callable, else False."""
     return hasattr(obj, '__call__')
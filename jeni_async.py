@@ -0,0 +1,533 @@
+# jeni_async.py
+# Copyright 2013-2015 Ron DuPlain <ron.duplain@gmail.com> (see AUTHORS file).
+# Released under the BSD License (see LICENSE file).
+
+"""``jeni_async`` injects annotated dependencies with asyncio (Python 3.7+)"""
+
+import asyncio
+import contextvars
+import functools
+import inspect
+
+import jeni
+from jeni import Note, UnsetError, DependencyCycleError
+from jeni import PARTIAL, PARTIAL_REGARDLESS, EAGER_PARTIAL_REGARDLESS
+from jeni import PARTIAL_KINDS, MISSING, SINGLETON, TRANSIENT
+
+
+#: Stack of (injector, note tuple) currently being instantiated. A context
+#: variable, such that notes resolved concurrently each track their own chain.
+instantiating = contextvars.ContextVar('jeni_async.instantiating', default=())
+
+
+async def maybe_await(value):
+    """Await value if it is awaitable, else return it as-is."""
+    if inspect.isawaitable(value):
+        return await value
+    return value
+
+
+async def aiter_sync(iterable):
+    """Iterate a plain iterable as an async iterable, closing it on aclose."""
+    items = iter(iterable)
+    try:
+        for item in items:
+            yield item
+    finally:
+        if hasattr(items, 'close'):
+            items.close()
+
+
+class AsyncGeneratorProvider(jeni.Provider):
+    """Manage async generator lifecycle to implement Provider interface.
+
+    The async counterpart of `jeni.GeneratorProvider`, used by
+    `AsyncInjector` to support registering async generators. Methods `init`,
+    `get` and `aclose` are coroutines::
+
+        async def generator(foo, bar):
+            yield
+            # continues when AsyncGeneratorProvider.aclose is awaited.
+        provider = AsyncGeneratorProvider(generator)
+        await provider.init('foo', 'bar')
+        await provider.get()
+    """
+
+    def __init__(self, function, support_name=False):
+        """Accept async generator function & whether it supports asend."""
+        if not inspect.isasyncgenfunction(function):
+            msg = '{!r} is not an async generator function'
+            raise TypeError(msg.format(function))
+        self.function = function
+        self.support_name = support_name
+        self.initialized = False
+
+    async def init(self, *a, **kw):
+        """Call function to create generator, passing arguments provided."""
+        self.generator = self.function(*a, **kw)
+        try:
+            self.init_value = await self.generator.__anext__()
+        except StopAsyncIteration:
+            msg = "generator didn't yield: function {!r}"
+            raise RuntimeError(msg.format(self.function))
+        else:
+            self.initialized = True
+            return self.init_value
+
+    async def get(self, name=None):
+        """Get initial yield value, or result of asend(name) if name given."""
+        if not self.initialized:
+            msg = '{!r} not initialized; call `init` before `get`.'
+            raise RuntimeError(msg.format(self))
+        if name is None:
+            return self.init_value
+        elif not self.support_name:
+            msg = "generator does not support get-by-name: function {!r}"
+            raise TypeError(msg.format(self.function))
+        try:
+            value = await self.generator.asend(name)
+        except StopAsyncIteration:
+            msg = "generator didn't yield: function {!r}"
+            raise RuntimeError(msg.format(self.function))
+        return value
+
+    def close(self):
+        """Async generators cannot be closed synchronously; use `aclose`."""
+        raise RuntimeError('{!r} requires aclose'.format(self))
+
+    async def aclose(self):
+        """Close the generator."""
+        if not self.initialized:
+            raise RuntimeError('{!r} not initialized'.format(self))
+        if self.support_name:
+            await self.generator.aclose()
+        try:
+            await self.generator.__anext__()
+        except StopAsyncIteration:
+            return
+        else:
+            msg = "generator didn't stop: function {!r}"
+            raise RuntimeError(msg.format(self.function))
+
+
+class AsyncInjector(jeni.Injector):
+    """Injector which resolves notes on an asyncio event loop.
+
+    In addition to everything `jeni.Injector` accepts, an AsyncInjector
+    registers ``async def`` factories, async generators and Provider classes
+    with ``async def get`` and ``async def aclose``::
+
+        from jeni_async import AsyncInjector
+
+        class Injector(AsyncInjector):
+            pass
+
+        @Injector.provider('db')
+        async def db():
+            pool = await open_pool()
+            yield pool
+            await pool.close()
+
+        async with Injector() as injector:
+            await injector.aapply(handler)
+
+    Within a single `aapply` (or `apartial`, `aget` of a provider with
+    annotations, ...), notes which are not yet provided are resolved
+    concurrently with ``asyncio.gather``. Each provider is still only
+    instantiated once, with a lock per basenote.
+
+    The synchronous API remains available for synchronous providers, but
+    async providers need the coroutine methods: `aget`, `aapply`,
+    `apartial`, `aeager_partial`, `aiapply` and `aclose`.
+    """
+    async_generator_provider = AsyncGeneratorProvider
+
+    __slots__ = ('alocks',)
+
+    def __init__(self, *a, **kw):
+        super(AsyncInjector, self).__init__(*a, **kw)
+
+        #: Lock per basenote, such that each provider is instantiated once.
+        self.alocks = {}
+
+    @classmethod
+    def provider(cls, note, provider=None, name=False, **kw):
+        """Register a provider: Provider class, generator or async generator.
+
+        See `jeni.Injector.provider`, including its `cache`, `fork_safe` and
+        `lifetime` keywords. Async generators are registered the same way as
+        generators::
+
+            @Injector.provider('spam', name=True)
+            async def spam():
+                count_str = yield 'spam'
+                while True:
+                    count_str = yield 'spam' * int(count_str)
+
+        Singletons are not supported, as their locks and values cannot be
+        shared across event loops.
+        """
+        def decorator(fn_or_class):
+            if inspect.isasyncgenfunction(fn_or_class):
+                fn_or_class.support_name = name
+                cls.register(note, fn_or_class, **kw)
+            else:
+                base = super(AsyncInjector, cls)
+                base.provider(note, fn_or_class, name=name, **kw)
+            return fn_or_class
+        if provider is not None:
+            decorator(provider)
+        else:
+            return decorator
+
+    @classmethod
+    def register(cls, note, provider, **kw):
+        """Implementation to register provider, see `provider`."""
+        if kw.get('lifetime') == SINGLETON:
+            msg = '{} does not support singleton {!r}'
+            raise ValueError(msg.format(cls.__name__, note))
+        super(AsyncInjector, cls).register(note, provider, **kw)
+
+    async def aapply(self, fn, *a, **kw):
+        """Fully apply annotated callable, awaiting callable's result.
+
+        The result is awaited if awaitable, such that both ``async def`` and
+        plain functions can be applied.
+        """
+        args, kwargs = await self.aprepare_callable(fn)
+        args += a; kwargs.update(kw)
+        return await maybe_await(fn(*args, **kwargs))
+
+    def apartial(self, fn, *user_args, **user_kwargs):
+        """Return coroutine function to lazily inject annotated callable.
+
+        Like `jeni.Injector.partial`, with injections resolved on the first
+        await of the resulting coroutine function and reused thereafter.
+        """
+        self.plan(fn, partial=True) # Assert has annotations.
+        arg_pack = []
+        async def lazy_injection_fn(*run_args, **run_kwargs):
+            if not arg_pack:
+                jeni_args, jeni_kwargs = await self.aprepare_callable(
+                    fn, partial=True)
+                pack_kwargs = {}
+                pack_kwargs.update(jeni_kwargs)
+                pack_kwargs.update(user_kwargs)
+                arg_pack[:] = [(jeni_args + user_args, pack_kwargs)]
+            pack_args, pack_kwargs = arg_pack[0]
+            final_kwargs = {}
+            final_kwargs.update(pack_kwargs)
+            final_kwargs.update(run_kwargs)
+            return await maybe_await(
+                fn(*(pack_args + run_args), **final_kwargs))
+        return lazy_injection_fn
+
+    async def aiapply(self, fn, iterable, batch=None):
+        """Apply annotated callable to each item, see `jeni.Injector.iapply`.
+
+        An async generator, which resolves injections on its first iteration,
+        and takes an async iterable or a plain iterable::
+
+            async for result in injector.aiapply(handle, messages):
+                pass
+
+        Results of `fn` are awaited if awaitable. When the generator is
+        closed early, the iterable is closed with `aclose` or `close`.
+        """
+        args, kwargs = await self.aprepare_callable(fn)
+        if hasattr(iterable, '__aiter__'):
+            items = iterable.__aiter__()
+        else:
+            items = aiter_sync(iterable)
+        try:
+            if batch is None:
+                async for item in items:
+                    yield await maybe_await(fn(*(args + (item,)), **kwargs))
+                return
+            chunk = []
+            async for item in items:
+                chunk.append(item)
+                if len(chunk) == batch:
+                    yield await maybe_await(fn(*(args + (chunk,)), **kwargs))
+                    chunk = []
+            if chunk:
+                yield await maybe_await(fn(*(args + (chunk,)), **kwargs))
+        finally:
+            if hasattr(items, 'aclose'):
+                await items.aclose()
+
+    async def aeager_partial(self, fn, *a, **kw):
+        """Partially apply annotated callable, see `jeni.Injector.eager_partial`.
+        """
+        args, kwargs = await self.aprepare_callable(fn, partial=True)
+        args += a; kwargs.update(kw)
+        return functools.partial(fn, *args, **kwargs)
+
+    async def aget(self, note):
+        """Resolve a single note, raw or `Note`, into an object."""
+        if self.closed:
+            raise RuntimeError('{!r} already closed'.format(self))
+
+        note = Note.of(note)
+
+        # Record request for note even if it fails to resolve.
+        self.stats[note.note] += 1
+
+        # Handle injection of partially applied annotated functions.
+        kind = note.kind
+        if kind in PARTIAL_KINDS:
+            fn, a, kw_items = note.inner
+            if kind in (PARTIAL_REGARDLESS, EAGER_PARTIAL_REGARDLESS):
+                if not self.has_annotations(fn):
+                    return functools.partial(fn, *a, **dict(kw_items))
+            if kind in (PARTIAL, PARTIAL_REGARDLESS):
+                return self.apartial(fn, *a, **dict(kw_items))
+            return await self.aeager_partial(fn, *a, **dict(kw_items))
+
+        if note.name is None:
+            if note.basenote in self.values:
+                return self.values[note.basenote]
+        elif note.basenote in self.named_caches:
+            value = self.named_caches[note.basenote].get(note.name, MISSING)
+            if value is not MISSING:
+                return value
+        try:
+            provider_or_fn = self.lookup(note.basenote)
+        except LookupError:
+            if self.parent is not None:
+                return await self.aresolve_parent(note)
+            msg = "Unable to resolve '{}'"
+            raise LookupError(msg.format(note.note))
+        return await self.aresolve(provider_or_fn, note)
+
+    async def aget_step(self, step):
+        """Resolve a single plan step into an object, see `jeni.Injector.plan`.
+        """
+        note, provider_or_fn = step
+        if provider_or_fn is None:
+            return await self.aget(note)
+        if self.closed:
+            raise RuntimeError('{!r} already closed'.format(self))
+        self.stats[note.note] += 1
+        if note.name is None:
+            if note.basenote in self.values:
+                return self.values[note.basenote]
+        elif note.basenote in self.named_caches:
+            value = self.named_caches[note.basenote].get(note.name, MISSING)
+            if value is not MISSING:
+                return value
+        return await self.aresolve(provider_or_fn, note)
+
+    async def aresolve(self, provider_or_fn, note):
+        """Get value from provider for `Note`, checking dependency cycles.
+
+        The provider is called while holding the lock of its basenote, unless
+        this chain of resolution already holds it.
+        """
+        if self.parent is not None and note.basenote not in self.scoped:
+            return await self.aresolve_parent(note)
+        stack = instantiating.get()
+        key = note.key
+        if (self, key) in stack:
+            notes = tuple(k for i, k in stack if i is self) + (key,)
+            msg = ' <- '.join(repr(k) for k in notes)
+            raise DependencyCycleError(msg, notes=notes)
+        basenote = note.basenote
+        token = instantiating.set(stack + ((self, key),))
+        try:
+            if any(i is self and k[0] == basenote for i, k in stack):
+                return await self.ahandle_provider(provider_or_fn, note)
+            lock = self.alocks.get(basenote)
+            if lock is None:
+                lock = self.alocks[basenote] = asyncio.Lock()
+            async with lock:
+                if note.name is None and basenote in self.values:
+                    return self.values[basenote]
+                return await self.ahandle_provider(provider_or_fn, note)
+        finally:
+            instantiating.reset(token)
+
+    async def aresolve_parent(self, note):
+        """Get value for `Note` from parent, see `jeni.Injector.resolve_parent`.
+        """
+        if isinstance(self.parent, AsyncInjector):
+            value = await self.parent.aget(note)
+        else:
+            value = self.parent.get(note)
+        if note.name is None and type(self.parent).lifetimes().get(
+                note.basenote) != TRANSIENT:
+            self.values[note.basenote] = value
+        return value
+
+    async def aclose(self):
+        """Close injector & injected providers, awaiting as needed.
+
+        Like `jeni.Injector.close`, awaiting `aclose` of providers which have
+        it, else calling `close` and awaiting its result if awaitable.
+        """
+        if self.closed:
+            raise RuntimeError('{!r} already closed'.format(self))
+        for basenote in reversed(self.get_order):
+            if basenote not in self.instances:
+                # Provider is not an instance; no close implementation.
+                continue
+            instance = self.instances[basenote]
+            if hasattr(instance, 'aclose'):
+                await instance.aclose()
+            else:
+                await maybe_await(instance.close())
+        self.closed = True
+
+    def reset(self):
+        """Clear injector for reuse, see `jeni.Injector.reset` & `areset`."""
+        super(AsyncInjector, self).reset()
+        self.alocks.clear()
+
+    async def areset(self):
+        """Close injector if not yet closed, awaiting, then clear for reuse.
+        """
+        if not self.closed:
+            await self.aclose()
+        self.reset()
+
+    async def aprepare_callable(self, fn, partial=False):
+        """Prepare arguments required to apply function, see `aprepare_plan`.
+        """
+        return await self.aprepare_plan(self.plan(fn, partial=partial))
+
+    async def aprepare_notes(self, *notes, **keyword_notes):
+        """Get injection values for all given notes, see `aprepare_plan`."""
+        __partial = keyword_notes.pop('__partial', False)
+        plan = self.plan_notes(notes, keyword_notes, partial=__partial)
+        return await self.aprepare_plan(plan)
+
+    async def aprepare_plan(self, plan):
+        """Get injection values for all steps of the given plan.
+
+        Values already provided are taken as-is, and all others are resolved
+        concurrently. If any required note fails, the first error in argument
+        order is raised once all notes are resolved.
+        """
+        steps = [(None, step, False) for step in plan.args]
+        steps.extend(plan.kwargs)
+        values = [None] * len(steps)
+        pending = []
+        for index, (arg, step, optional) in enumerate(steps):
+            note, provider_or_fn = step
+            if (provider_or_fn is not None and note.name is None
+                    and note.basenote in self.values):
+                values[index] = self.get_step(step)
+            else:
+                pending.append(index)
+        if len(pending) == 1:
+            try:
+                results = [await self.aget_step(steps[pending[0]][1])]
+            except Exception as err:
+                results = [err]
+        elif pending:
+            results = await asyncio.gather(
+                *[self.aget_step(steps[index][1]) for index in pending],
+                return_exceptions=True)
+        else:
+            results = []
+        skipped = set()
+        for index, result in zip(pending, results):
+            if isinstance(result, BaseException):
+                if steps[index][2] and isinstance(result, LookupError):
+                    skipped.add(index)
+                    continue
+                raise result
+            values[index] = result
+        num_args = len(plan.args)
+        args = tuple(values[:num_args])
+        kwargs = {}
+        for index in range(num_args, len(steps)):
+            if index not in skipped:
+                kwargs[steps[index][0]] = values[index]
+        return args, kwargs
+
+    async def ahandle_provider(self, provider_or_fn, note):
+        """Get value from provider as requested by note, awaiting as needed.
+        """
+        note = Note.of(note)
+        basenote, name = note.key
+        result = await self._ahandle_provider(
+            provider_or_fn, note.note, basenote, name)
+        if basenote not in self.get_order:
+            self.get_order[basenote] = None
+        return result
+
+    async def _ahandle_provider(self, provider_or_fn, note, basenote, name):
+        lifetime = self.lifetimes().get(basenote)
+        if lifetime == SINGLETON:
+            # Registered on a synchronous base class, see `register`.
+            msg = '{} does not support singleton {!r}'
+            raise ValueError(msg.format(type(self).__name__, basenote))
+        if basenote in self.instances:
+            provider_or_fn = self.instances[basenote]
+        elif inspect.isclass(provider_or_fn):
+            # Inject class __init__, if annotated.
+            cls = provider_or_fn
+            if hasattr(cls, '__init__') and self.has_annotations(cls.__init__):
+                args, kwargs = await self.aprepare_callable(cls.__init__)
+                provider_or_fn = provider_or_fn(*args, **kwargs)
+            else:
+                provider_or_fn = provider_or_fn()
+            self.keep_instance(basenote, provider_or_fn)
+        elif (inspect.isgeneratorfunction(provider_or_fn) or
+                inspect.isasyncgenfunction(provider_or_fn)):
+            provider_or_fn, value = await self.ainit_generator(provider_or_fn)
+            self.keep_instance(basenote, provider_or_fn)
+            self.values[basenote] = value
+            if name is None:
+                return value
+        if hasattr(provider_or_fn, 'get'):
+            fn = provider_or_fn.get
+        else:
+            fn = provider_or_fn
+        try:
+            if self.has_annotations(fn):
+                args, kwargs = await self.aprepare_callable(fn, partial=True)
+            else:
+                args, kwargs = (), {}
+            if name is None:
+                value = await maybe_await(fn(*args, **kwargs))
+                if lifetime != TRANSIENT:
+                    self.values[basenote] = value
+                return value
+            kwargs['name'] = name
+            value = await maybe_await(fn(*args, **kwargs))
+            cache = self.named_cache(basenote)
+            if cache is not None:
+                cache.set(name, value)
+            return value
+        except UnsetError as err:
+            exc_msg = str(err)
+            if exc_msg:
+                msg = '{}: {!r}'.format(exc_msg, note)
+            else:
+                msg = repr(note)
+            raise type(err)(msg, note=note).with_traceback(err.__traceback__)
+
+    async def ainit_generator(self, fn):
+        """Implementation to initialize generator & async generator providers.
+        """
+        if inspect.isasyncgenfunction(fn):
+            provider_class = self.async_generator_provider
+        else:
+            provider_class = self.generator_provider
+        provider = provider_class(fn, support_name=fn.support_name)
+        if self.has_annotations(provider.function):
+            args, kwargs = await self.aprepare_callable(provider.function)
+        else:
+            args, kwargs = (), {}
+        value = await maybe_await(provider.init(*args, **kwargs))
+        return provider, value
+
+    async def __aenter__(self):
+        """Support for async context manager, returning self."""
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        """Support for async context manager, close on exit."""
+        await self.aclose()
@@ -9,6 +9,13 @@ try:
 except SystemExit:
     pass
 
+if sys.version_info >= (3, 7):
+    import test_jeni_async
+    try:
+        unittest.main(module=test_jeni_async)
+    except SystemExit:
+        pass
+
 if sys.version_info < (3,):
     import test_jeni_python2
     unittest.main(module=test_jeni_python2)
@@ -54,8 +54,5 @@ setup(
     author_email='ron.duplain@gmail.com',
     description='jeni injects annotated dependencies',
     long_description=long_description,
-    py_modules=['jeni'],
-    install_requires=[
-        'six',
-    ],
+    py_modules=['jeni', 'jeni_async'],
     classifiers=CLASSIFIERS)
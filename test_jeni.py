@@ -1,5 +1,15 @@
+import collections
+import functools
+import gc
+import inspect
+import json
+import os
 import sys
+import tempfile
+import threading
+import time
 import unittest
+import weakref
 
 import jeni
 
@@ -143,6 +153,20 @@ class InjectSelfTestCase(unittest.TestCase):
         self.injector = jeni.Injector(provide_self=False)
         self.assertRaises(LookupError, self.injector.get, 'injector')
 
+    def test_provide_self_not_registered(self):
+        version = jeni.Injector.registry_version
+        injector = jeni.Injector(provide_self=True)
+        self.assertEqual(version, jeni.Injector.registry_version)
+        self.assertNotIn('injector', jeni.Injector.registry())
+
+        @jeni.annotate('injector')
+        def fn(injector):
+            return injector
+        self.assertIs(injector, injector.apply(fn))
+        self.assertIs(injector, injector.compile(fn)())
+        injector.reset()
+        self.assertIs(injector, injector.get('injector'))
+
 
 class SubInjectorTestCase(BasicInjectorTestCase):
     def setUp(self):
@@ -452,6 +476,570 @@ class TestCycles(unittest.TestCase):
                 ('three', None),
                 ('two', None),
                 ('one', None)))
+        self.assertEqual(
+            "('one', None) <- ('three', None) <- ('two', None) <- ('one', None)",
+            str(raises.exception))
+        self.assertEqual(0, len(self.injector.instantiating))
+
+    def test_wide_graph_get_order(self):
+        class Injector(jeni.Injector):
+            pass
+        notes = ['dep{}'.format(n) for n in range(50)]
+        for note in notes:
+            Injector.value(note, note)
+        @Injector.factory('top')
+        @jeni.annotate(*notes)
+        def top(*deps):
+            return deps
+        injector = Injector()
+        self.assertEqual(tuple(notes), injector.get('top'))
+        self.assertEqual(notes + ['top'], list(injector.get_order))
+
+
+class GraphTestCase(unittest.TestCase):
+    def setUp(self):
+        class Injector(jeni.Injector):
+            pass
+
+        @Injector.provider('pool')
+        class PoolProvider(jeni.Provider):
+            @jeni.annotate('config')
+            def __init__(self, config):
+                "unused"
+
+            @jeni.annotate(timeout=jeni.maybe('timeout'))
+            def get(self, timeout=None):
+                "unused"
+
+        @Injector.provider('session')
+        @jeni.annotate('pool', jeni.partial(handler))
+        def session(pool, handler):
+            yield pool
+
+        Injector.value('config', {})
+        self.Injector = Injector
+
+    def test_order(self):
+        graph = self.Injector.validate()
+        self.assertEqual(('config',), graph.dependencies['pool'])
+        self.assertEqual(('pool',), graph.dependencies['session'])
+        # Only notes of this test, as jeni.Injector may have registrations.
+        notes = ('config', 'pool', 'session')
+        self.assertEqual(
+            ['config', 'pool', 'session'],
+            [note for note in graph.order if note in notes])
+        self.assertTrue(graph.valid)
+
+    def test_missing(self):
+        @jeni.annotate('pool', 'nothing', maybe=jeni.maybe('nothing'))
+        def entry_point(pool, nothing, maybe=None):
+            "unused"
+        graph = self.Injector.graph(entry_points=[entry_point])
+        self.assertEqual(
+            [(entry_point, jeni.Note.of('nothing'))], graph.missing)
+        self.assertRaises(
+            LookupError, self.Injector.validate, entry_points=[entry_point])
+        self.Injector.validate(
+            entry_points=[entry_point], provided=['nothing'])
+
+    def test_cycle(self):
+        @self.Injector.factory('config')
+        @jeni.annotate('session')
+        def config(session):
+            "unused"
+        graph = self.Injector.graph()
+        self.assertEqual([('pool', 'config', 'session', 'pool')],
+                         graph.cycles)
+        with self.assertRaises(jeni.DependencyCycleError) as raises:
+            self.Injector.validate()
+        self.assertEqual(
+            (('pool', None), ('config', None), ('session', None),
+             ('pool', None)),
+            raises.exception.notes)
+
+    def test_cached(self):
+        graph = self.Injector.graph()
+        self.assertIs(graph, self.Injector.graph())
+        self.assertIs(graph.order, self.Injector.graph(
+            entry_points=[handler], provided=['config']).order)
+        self.Injector.value('late', None)
+        self.assertIsNot(graph, self.Injector.graph())
+        self.assertIn('late', self.Injector.graph().dependencies)
+
+    def test_lazy_partial_is_not_a_dependency(self):
+        @self.Injector.factory('handler')
+        @jeni.annotate(jeni.partial(handler))
+        def handler_factory(fn):
+            "unused"
+        self.Injector.validate()
+
+    def test_validated_skips_cycle_checks(self):
+        self.Injector.validate()
+        injector = self.Injector()
+        injector.instantiating = None
+        injector.get('session')
+        self.Injector.value('late', None)
+        self.assertRaises(TypeError, injector.get, 'late')
+
+    def test_validated_checks_cycles_with_injector(self):
+        @self.Injector.factory('lookup')
+        @jeni.annotate('injector')
+        def lookup(injector):
+            return injector.get('lookup')
+        self.Injector.validate(provided=['injector'])
+        injector = self.Injector(provide_self=True)
+        self.assertRaises(jeni.DependencyCycleError, injector.get, 'lookup')
+
+
+@jeni.annotate('session')
+def handler(session):
+    "unused"
+
+
+class WarmupTestCase(unittest.TestCase):
+    def setUp(self):
+        class Injector(jeni.Injector):
+            pass
+
+        for n in range(4):
+            @Injector.provider('slow{}'.format(n))
+            class SlowProvider(jeni.Provider):
+                def __init__(self, n=n):
+                    time.sleep(0.1)
+                    self.n = n
+
+                def get(self, name=None):
+                    return self.n
+
+        @Injector.provider('top')
+        class TopProvider(jeni.Provider):
+            @jeni.annotate('slow0', 'slow1', 'slow2', 'slow3')
+            def __init__(self, *slow):
+                self.total = sum(slow)
+
+            def get(self, name=None):
+                return self.total
+
+        @Injector.provider('header')
+        class HeaderProvider(jeni.Provider):
+            def get(self, name):
+                return name.upper()
+
+        @Injector.factory('buffer', lifetime='transient')
+        def buffer():
+            raise AssertionError('factories are not called')
+
+        @Injector.provider('unset')
+        class UnsetProvider(jeni.Provider):
+            def __init__(self):
+                raise jeni.UnsetError()
+
+            def get(self, name=None):
+                "unused"
+
+        self.Injector = Injector
+
+    def test_concurrent(self):
+        start = time.time()
+        injector = self.Injector.warmup()
+        self.assertTrue(time.time() - start < 0.3)
+        self.assertTrue(injector.threadsafe)
+        self.assertEqual(6, injector.instances['top'].total)
+        self.assertEqual('top', list(injector.warmup_times)[-1])
+        self.assertNotIn('unset', injector.warmup_times)
+        self.assertNotIn('buffer', injector.warmup_times)
+        self.assertEqual('X', injector.get('header:x'))
+        self.assertNotIn('header', injector.values)
+
+    def test_notes(self):
+        injector = self.Injector()
+        self.assertIs(injector, injector.warmup(['slow0', 'slow1']))
+        self.assertEqual(['slow0', 'slow1'], sorted(injector.instances))
+        # Recorded to be closed as if provided.
+        self.assertEqual(['slow0', 'slow1'], sorted(injector.get_order))
+
+    def test_errors(self):
+        @self.Injector.provider('slow1')
+        class FailProvider(jeni.Provider):
+            def __init__(self):
+                raise ValueError('fail')
+
+            def get(self, name=None):
+                "unused"
+        injector = self.Injector()
+        with self.assertRaises(jeni.WarmupError) as raises:
+            injector.warmup(['top', 'nothing'])
+        self.assertEqual(
+            ['slow1'], list(raises.exception.errors))
+        self.assertNotIn('top', injector.instances)
+
+    def test_not_registered(self):
+        with self.assertRaises(jeni.WarmupError) as raises:
+            self.Injector().warmup(['nothing'])
+        self.assertIsInstance(raises.exception.errors['nothing'], LookupError)
+
+
+class ForkTestCase(unittest.TestCase):
+    def setUp(self):
+        class Injector(jeni.Injector):
+            pass
+
+        self.connections = connections = []
+        self.closed = closed = []
+
+        @Injector.provider('settings')
+        class SettingsProvider(jeni.Provider):
+            def get(self, name=None):
+                return {'dsn': 'db://'}
+
+        @Injector.provider('db')
+        class DatabaseProvider(jeni.Provider):
+            @jeni.annotate('settings')
+            def __init__(self, settings):
+                self.settings = settings
+                self.after_fork()
+
+            def after_fork(self):
+                connections.append(object())
+                self.connection = connections[-1]
+
+            def get(self, name=None):
+                return self.connection
+
+        @Injector.factory('repository')
+        @jeni.annotate('db')
+        def repository(db):
+            return {'db': db}
+
+        @Injector.provider('socket', fork_safe=False)
+        def socket():
+            connections.append(object())
+            connection = connections[-1]
+            yield connection
+            closed.append(connection)
+
+        @Injector.factory('client')
+        @jeni.annotate('socket')
+        def client(socket):
+            return {'socket': socket}
+
+        self.Injector = Injector
+
+    def tearDown(self):
+        if hasattr(gc, 'unfreeze'):
+            gc.unfreeze()
+
+    def test_fork_unsafe(self):
+        self.assertEqual(
+            frozenset(['socket', 'client']), self.Injector.fork_unsafe())
+
+        class SubInjector(self.Injector):
+            pass
+        SubInjector.value('socket', None)
+        self.assertEqual(frozenset(), SubInjector.fork_unsafe())
+
+    def test_preload(self):
+        injector = self.Injector.preload()
+        for note in ('db', 'settings'):
+            self.assertIn(note, injector.instances)
+        self.assertNotIn('socket', injector.instances)
+        self.assertEqual(1, len(self.connections))
+
+    def test_after_fork(self):
+        injector = self.Injector()
+        settings, repository, client = (
+            injector.get(note) for note in ('settings', 'repository', 'client'))
+        db, socket = injector.instances['db'], injector.instances['socket']
+        self.assertIs(injector, injector.after_fork())
+        self.assertEqual([socket], injector.abandoned)
+
+        # Values of fork-safe providers without after_fork are kept.
+        self.assertIs(settings, injector.get('settings'))
+        # Providers implementing after_fork are kept, but provide again.
+        self.assertIs(db, injector.instances['db'])
+        self.assertIs(self.connections[-1], injector.get('db'))
+        self.assertIsNot(repository, injector.get('repository'))
+        self.assertIs(self.connections[-1], injector.get('repository')['db'])
+        # Fork-unsafe providers are built again.
+        self.assertIsNot(client['socket'], injector.get('client')['socket'])
+        self.assertEqual([], self.closed)
+        injector.close()
+        self.assertEqual([self.connections[-1]], self.closed)
+
+    @unittest.skipUnless(hasattr(os, 'fork'), 'requires os.fork')
+    def test_fork(self):
+        injector = self.Injector(threadsafe=True).preload()
+        connection = injector.get('db')
+        read, write = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            try:
+                injector.after_fork()
+                ok = injector.get('db') is not connection and \
+                    injector.get('settings') is injector.values['settings']
+                os.write(write, b'ok' if ok else b'no')
+            finally:
+                os._exit(0)
+        os.close(write)
+        os.waitpid(pid, 0)
+        self.assertEqual(b'ok', os.read(read, 2))
+        os.close(read)
+
+    @unittest.skipUnless(hasattr(os, 'fork'), 'requires os.fork')
+    def test_fork_singletons(self):
+        class Injector(self.Injector):
+            pass
+        for note in ('settings', 'db', 'socket'):
+            Injector.provider(note, Injector.lookup(note),
+                              fork_safe=note != 'socket',
+                              lifetime='singleton')
+        one, two = Injector(), Injector()
+        db, socket = one.get('db'), one.get('socket')
+        self.assertIs(db, two.get('db'))
+        record, lock = Injector.singletons['db'], Injector.singleton_locks['db']
+        socket_provider = Injector.singletons['socket'][1]
+        read, write = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            try:
+                count = len(self.connections)
+                one.after_fork()
+                two.after_fork()
+                ok = (
+                    # after_fork called once for all injectors, in place.
+                    len(self.connections) == count + 1 and
+                    Injector.singletons['db'] is record and
+                    one.get('db') is self.connections[count] and
+                    two.get('db') is one.get('db') and
+                    # Fork-unsafe singletons are built again.
+                    one.abandoned == [socket_provider] and
+                    one.get('socket') is not socket and
+                    Injector.singleton_locks['db'] is not lock)
+                os.write(write, b'ok' if ok else b'no')
+            finally:
+                os._exit(0)
+        os.close(write)
+        os.waitpid(pid, 0)
+        self.assertEqual(b'ok', os.read(read, 2))
+        os.close(read)
+        self.assertIs(db, two.get('db'))
+        Injector.close_singletons()
+        self.assertEqual([socket], self.closed)
+
+
+class PlanTestCase(unittest.TestCase):
+    def setUp(self):
+        class Base(BasicInjector):
+            pass
+        class Injector(Base):
+            pass
+        self.Base = Base
+        self.Injector = Injector
+        self.injector = Injector()
+
+        @jeni.annotate('hello', 'hello:x', eggs=jeni.maybe('eggs'))
+        def fn(hello, hello_x, eggs=None):
+            return hello, hello_x, eggs
+        self.fn = fn
+
+    def test_plan_is_cached(self):
+        plan = self.Injector.plan(self.fn)
+        self.assertIs(plan, self.Injector.plan(self.fn))
+        self.assertIsNot(plan, self.Injector.plan(self.fn, partial=True))
+
+    def test_plan_steps(self):
+        plan = self.Injector.plan(self.fn)
+        self.assertEqual(
+            [('hello', HelloProvider), ('hello:x', HelloProvider)],
+            list(plan.args))
+        self.assertEqual(('eggs', ('eggs', eggs), True), plan.kwargs[0])
+
+    def test_register_invalidates_plan(self):
+        plan = self.Injector.plan(self.fn)
+        self.assertEqual(
+            ('Hello, world!', 'Hello, x!', 'eggs!'),
+            self.injector.apply(self.fn))
+        self.Base.factory('unrelated', eggs)
+        self.assertIsNot(plan, self.Injector.plan(self.fn))
+        self.Base.factory('hello', echo)
+        self.assertEqual((None, 'x', 'eggs!'), self.Injector().apply(self.fn))
+
+    def test_plan_of_method(self):
+        class X(object):
+            @jeni.annotate('eggs')
+            def eat(self, eggs):
+                return eggs
+        self.assertIs(self.Injector.plan(X().eat), self.Injector.plan(X().eat))
+        self.assertEqual('eggs!', self.injector.apply(X().eat))
+
+    def test_not_annotated(self):
+        self.assertRaises(AttributeError, self.Injector.plan, lambda: None)
+
+
+class PlanFileInjector(BasicInjector):
+    pass
+
+
+@jeni.annotate('hello', eggs='eggs')
+def hello_eggs(hello, eggs):
+    return hello, eggs
+
+
+class Handlers(object):
+    @jeni.annotate('eggs')
+    def eat(self, eggs):
+        return eggs
+
+
+class PlanFileTestCase(unittest.TestCase):
+    def setUp(self):
+        fd, self.filename = tempfile.mkstemp()
+        os.close(fd)
+        if 'plan_cache' in vars(PlanFileInjector):
+            del PlanFileInjector.plan_cache
+
+    def tearDown(self):
+        os.remove(self.filename)
+
+    def test_round_trip(self):
+        PlanFileInjector.plan(hello_eggs)
+        PlanFileInjector.plan(Handlers().eat, partial=True)
+        PlanFileInjector.plan(jeni.annotate('eggs')(lambda eggs: eggs))
+        # Methods have no qualified name on Python 2, so are left out.
+        methods = 1 if sys.version_info[0] >= 3 else 0
+        self.assertEqual(
+            1 + methods, PlanFileInjector.save_plans(self.filename))
+
+        del PlanFileInjector.plan_cache
+        self.assertEqual(
+            1 + methods, PlanFileInjector.load_plans(self.filename))
+        plans = PlanFileInjector.plan_cache
+        self.assertEqual(
+            [True, False], [p is not None for p in plans[hello_eggs]])
+        if methods:
+            self.assertEqual(
+                [False, True], [p is not None for p in plans[Handlers.eat]])
+        self.assertEqual(
+            ('Hello, world!', 'eggs!'), PlanFileInjector().apply(hello_eggs))
+
+    def test_other_class(self):
+        PlanFileInjector.plan(hello_eggs)
+        PlanFileInjector.save_plans(self.filename)
+        self.assertEqual(0, SubInjector.load_plans(self.filename))
+        self.assertEqual(1, BasicInjector.load_plans(self.filename))
+
+    def test_stale(self):
+        with open(self.filename, 'w') as fd:
+            json.dump({'jeni': jeni.__version__, 'injectors': {
+                'test_jeni:PlanFileInjector': [
+                    ['test_jeni:nothing', [True, False]],
+                    ['not_imported:hello_eggs', [True, False]],
+                    ['test_jeni:Handlers', [True, False]],
+                    ['test_jeni:hello_eggs', [True, False]]]}}, fd)
+        self.assertEqual(1, PlanFileInjector.load_plans(self.filename))
+
+    def test_unusable_file(self):
+        self.assertEqual(0, PlanFileInjector.load_plans(self.filename))
+        with open(self.filename, 'w') as fd:
+            json.dump({'jeni': '0.0', 'injectors': {}}, fd)
+        self.assertEqual(0, PlanFileInjector.load_plans(self.filename))
+        os.remove(self.filename)
+        self.assertEqual(0, PlanFileInjector.load_plans(self.filename))
+        open(self.filename, 'w').close()
+
+
+class RegistryTestCase(unittest.TestCase):
+    def setUp(self):
+        class Base(jeni.Injector):
+            pass
+        class Mixin(object):
+            pass
+        class Injector(Mixin, Base):
+            pass
+        class Override(Injector):
+            pass
+        Base.factory('eggs', eggs)
+        Override.factory('eggs', echo)
+        self.Base, self.Injector, self.Override = Base, Injector, Override
+
+    def test_lookup(self):
+        self.assertIs(eggs, self.Injector.lookup('eggs'))
+        self.assertIs(echo, self.Override.lookup('eggs'))
+        self.assertRaises(LookupError, self.Injector.lookup, 'hello')
+
+    def test_registry_is_cached(self):
+        registry = self.Override.registry()
+        self.assertIs(echo, registry['eggs'])
+        self.assertIs(registry, self.Override.registry())
+
+    def test_late_registration(self):
+        self.Injector.lookup('eggs')
+        self.Override.lookup('eggs')
+        self.Base.provider('hello', HelloProvider)
+        self.assertIs(HelloProvider, self.Injector.lookup('hello'))
+        self.assertIs(HelloProvider, self.Override.lookup('hello'))
+        self.assertEqual('Hello, world!', self.Override().get('hello'))
+        self.Injector.factory('eggs', spam_eggs)
+        self.assertIs(spam_eggs, self.Injector.lookup('eggs'))
+        self.assertIs(echo, self.Override.lookup('eggs'))
+        self.assertIs(eggs, self.Base.lookup('eggs'))
+
+
+class NoteTestCase(unittest.TestCase):
+    def test_parse(self):
+        note = jeni.Note.of('hello:world')
+        self.assertEqual(('hello', 'world', jeni.PLAIN),
+                         (note.basenote, note.name, note.kind))
+        self.assertEqual((None, None), jeni.Note.of(None).key)
+        self.assertEqual(('hello', 'name'), jeni.Note.of(('hello', 'name')).key)
+        self.assertRaises(ValueError, jeni.Note.of, ('hello',))
+
+    def test_interned(self):
+        note = jeni.Note.of('hello:interned')
+        self.assertIs(note, jeni.Note.of('hello:interned'))
+        self.assertIs(note, jeni.Note.of(note))
+
+    def test_equal_to_raw_note(self):
+        note = jeni.Note.of('hello:world')
+        self.assertEqual('hello:world', note)
+        self.assertEqual(hash('hello:world'), hash(note))
+        self.assertEqual({'hello:world': 1}, {note: 1})
+
+    def test_immutable(self):
+        note = jeni.Note.of('hello')
+        def set_name():
+            note.name = 'world'
+        self.assertRaises(AttributeError, set_name)
+
+    def test_kinds(self):
+        self.assertEqual(jeni.MAYBE, jeni.maybe('hello:x').kind)
+        self.assertEqual(('hello', 'x'), jeni.maybe('hello:x').key)
+        self.assertEqual(jeni.PARTIAL, jeni.partial(spam_eggs).kind)
+        self.assertEqual(
+            jeni.EAGER_PARTIAL, jeni.eager_partial(spam_eggs).kind)
+
+    def test_annotate_interns(self):
+        @jeni.annotate('hello:x', eggs='eggs')
+        def fn(hello, eggs):
+            "unused"
+        (note,), keyword_notes = jeni.annotate.get_annotations(fn)
+        self.assertIs(jeni.Note.of('hello:x'), note)
+        self.assertIs(jeni.Note.of('eggs'), keyword_notes['eggs'])
+
+    def test_bounded_cache(self):
+        cache_size = jeni.Note.cache_size
+        jeni.Note.cache_size = 8
+        try:
+            for n in range(100):
+                jeni.Note.of('bounded:{}'.format(n))
+                self.assertTrue(len(jeni.Note.cache) <= 8)
+        finally:
+            jeni.Note.cache_size = cache_size
+
+    def test_get_accepts_note(self):
+        injector = BasicInjector()
+        self.assertEqual('Hello, x!', injector.get(jeni.Note.of('hello:x')))
+        self.assertEqual(1, injector.stats['hello:x'])
 
 
 class WrapsTestCase(unittest.TestCase):
@@ -640,6 +1228,49 @@ def hello_again_eager_partial_regardless_unannotated(hello, fn, **keywords):
     return hello, fn(), keywords
 
 
+class IApplyTestCase(unittest.TestCase):
+    def setUp(self):
+        self.injector = BasicInjector()
+
+        @jeni.annotate('hello')
+        def fn(hello, item):
+            return hello, item
+        self.fn = fn
+
+    def test_iapply(self):
+        results = self.injector.iapply(self.fn, range(3))
+        self.assertEqual(1, self.injector.stats['hello'])
+        self.assertEqual(
+            [('Hello, world!', n) for n in range(3)], list(results))
+        self.assertEqual(1, self.injector.stats['hello'])
+
+    def test_batch(self):
+        results = self.injector.iapply(self.fn, range(5), batch=2)
+        self.assertEqual(
+            [[0, 1], [2, 3], [4]], [items for _, items in results])
+
+    def test_stop_early(self):
+        closed = []
+
+        def items():
+            try:
+                for n in range(10):
+                    yield n
+            finally:
+                closed.append(True)
+        results = self.injector.iapply(self.fn, items())
+        self.assertEqual(('Hello, world!', 0), next(results))
+        results.close()
+        self.assertEqual([True], closed)
+        self.assertFalse(self.injector.closed)
+
+    def test_resolved_on_call(self):
+        @jeni.annotate('nothing')
+        def fn(nothing, item):
+            "unused"
+        self.assertRaises(LookupError, self.injector.iapply, fn, [1])
+
+
 class InjectPartialTestCase(unittest.TestCase):
     def setUp(self):
         self.injector = BasicInjector()
@@ -719,6 +1350,60 @@ class LazyPartialTestCase(unittest.TestCase):
         fn()
         self.assertEqual(1, self.injector.stats[note])
 
+    def test_metadata(self):
+        fn = self.injector.partial(hello_partial)
+        self.assertEqual('hello_partial', fn.__name__)
+        self.assertEqual(hello_partial.__doc__, fn.__doc__)
+        self.assertIs(hello_partial, fn.__wrapped__)
+        self.assertEqual(hello_partial.__module__, fn.__module__)
+        self.assertFalse(jeni.annotate.has_annotations(fn))
+        jeni.annotate('eggs')(fn)
+        self.assertTrue(jeni.annotate.has_annotations(fn))
+        self.assertRaises(AttributeError, setattr, fn, 'other', None)
+
+    def test_function_attributes(self):
+        @jeni.annotate('hello')
+        def fn(hello):
+            return hello
+        fn.route = '/hello'
+        partial = self.injector.partial(fn)
+        self.assertEqual('/hello', partial.route)
+        self.assertFalse(hasattr(partial, 'other'))
+        self.assertFalse(jeni.annotate.has_annotations(partial))
+
+    def test_keywords(self):
+        @jeni.annotate(eggs='eggs')
+        def fn(a, eggs, **kw):
+            return a, eggs, kw
+        partial_fn = self.injector.partial(fn, 'a', spam='spam')
+        self.assertEqual(('a', 'eggs!', {'spam': 'spam'}), partial_fn())
+        self.assertEqual(('a', 'EGGS', {'spam': 'SPAM', 'x': 1}),
+                         partial_fn(eggs='EGGS', spam='SPAM', x=1))
+        self.assertEqual(('a', 'eggs!', {'spam': 'spam'}), partial_fn())
+
+    def test_threadsafe_injection(self):
+        calls = []
+
+        class Injector(BasicInjector):
+            pass
+
+        @Injector.factory('slow')
+        def slow(name=None):
+            calls.append(name)
+            time.sleep(0.01)
+            return name
+
+        @jeni.annotate('slow:x')
+        def fn(x):
+            return x
+        partial_fn = Injector(threadsafe=True).partial(fn)
+        threads = [threading.Thread(target=partial_fn) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(['x'], calls)
+
 
 class CloseMe(object):
     # List of all closed instances for use in test inspection.
@@ -872,6 +1557,100 @@ class ClosingTestCase(unittest.TestCase):
         self.assertRaises(TypeError, self.injector.close)
 
 
+class ResetTestCase(unittest.TestCase):
+    def setUp(self):
+        self.injector = CloseTestInjector()
+
+    def test_reset(self):
+        thing = self.injector.get('via_generator')
+        instances, values = self.injector.instances, self.injector.values
+        self.injector.reset()
+        self.assertTrue(thing.closed)
+        self.assertFalse(self.injector.closed)
+        self.assertEqual({}, self.injector.stats)
+        self.assertEqual([], list(self.injector.get_order))
+        self.assertIs(instances, self.injector.instances)
+        self.assertIs(values, self.injector.values)
+        self.assertEqual({}, values)
+        again = self.injector.get('via_generator')
+        self.assertIsNot(thing, again)
+        self.assertFalse(again.closed)
+
+    def test_reset_after_close(self):
+        thing = self.injector.get('via_class')
+        self.injector.close()
+        self.injector.reset()
+        self.assertTrue(thing.closed)
+        self.assertEqual('thing', self.injector.get('echo:thing'))
+
+
+class CompactInjectorTestCase(unittest.TestCase):
+    def test_slots(self):
+        injector = BasicInjector()
+        self.assertEqual('eggs!', injector.get('eggs'))
+        self.assertEqual({}, vars(injector))
+        self.assertIs(injector.annotator, BasicInjector().annotator)
+
+    def test_lazy_containers(self):
+        one, two = BasicInjector(), BasicInjector()
+        self.assertIs(one.compiled, two.compiled)
+        self.assertIs(one.instances, two.instances)
+        self.assertIs(one.instantiating, two.instantiating)
+        self.assertEqual('eggs!', one.get('eggs'))
+        self.assertIs(one.instances, two.instances)
+        self.assertIsNot(one.instantiating, two.instantiating)
+        threadsafe = BasicInjector(threadsafe=True)
+        self.assertEqual('Hello, world!', threadsafe.get('hello'))
+        self.assertIs(two.instantiating, threadsafe.instantiating)
+        self.assertEqual(['hello'], list(threadsafe.instances))
+        self.assertEqual(0, len(one.warmup_times))
+        one.warmup(['hello'])
+        self.assertEqual(['hello'], list(one.warmup_times))
+        self.assertEqual(0, len(two.warmup_times))
+        one.reset()
+        self.assertEqual(0, len(one.warmup_times))
+
+    def test_subclass_attributes(self):
+        injector = BasicInjector(hooks=[jeni.Hook()])
+        injector.custom = 'custom'
+        self.assertEqual('custom', vars(injector)['custom'])
+        self.assertEqual('eggs!', injector.get('eggs'))
+
+
+class InjectorPoolTestCase(unittest.TestCase):
+    def test_reuse(self):
+        pool = jeni.InjectorPool(CloseTestInjector, size=1)
+        with pool.injector() as injector:
+            thing = injector.get('via_class')
+        self.assertTrue(thing.closed)
+        with pool.injector() as again:
+            self.assertIs(injector, again)
+            self.assertIsNot(thing, again.get('via_class'))
+
+    def test_size(self):
+        pool = jeni.InjectorPool(BasicInjector, size=2)
+        injectors = [pool.acquire() for _ in range(3)]
+        self.assertEqual(3, len(set(injectors)))
+        for injector in injectors:
+            pool.release(injector)
+        self.assertEqual(2, len(pool.idle))
+
+    def test_prewarm(self):
+        pool = jeni.InjectorPool(BasicInjector, size=4, prewarm=True)
+        pool.prewarm_thread.join()
+        self.assertEqual(4, len(pool.idle))
+        idle = list(pool.idle)
+        self.assertIn(pool.acquire(), idle)
+
+    def test_child_factory(self):
+        app = AppInjector()
+        pool = jeni.InjectorPool(functools.partial(app.child, RequestInjector))
+        with pool.injector() as injector:
+            session, pool_thing = injector.get('session')
+        self.assertTrue(session.closed)
+        self.assertFalse(pool_thing.closed)
+
+
 class InjectorStatsTestCase(unittest.TestCase):
     def setUp(self):
         self.injector = BasicInjector()
@@ -906,6 +1685,877 @@ class InjectorStatsTestCase(unittest.TestCase):
         self.assertEqual(stats, self.injector.stats)
 
 
+class ThreadSafeInjector(jeni.Injector):
+    pass
+
+
+@ThreadSafeInjector.provider('slow')
+class SlowProvider(jeni.Provider):
+    instances = []
+
+    def __init__(self):
+        time.sleep(0.01)
+        self.instances.append(self)
+
+    def get(self, name=None):
+        return self
+
+
+@ThreadSafeInjector.provider('counter', name=True)
+def counter():
+    count = 0
+    increment = yield count
+    while True:
+        time.sleep(0.001)
+        count += int(increment)
+        increment = yield count
+
+
+@ThreadSafeInjector.factory('slow_dependent')
+@jeni.annotate('slow')
+def slow_dependent(slow):
+    return slow
+
+
+class ThreadSafeTestCase(unittest.TestCase):
+    def setUp(self):
+        self.injector = ThreadSafeInjector(threadsafe=True)
+        self.errors = []
+
+    def run_threads(self, fn, count=8):
+        def target():
+            try:
+                fn()
+            except Exception:
+                self.errors.append(sys.exc_info()[1])
+        threads = [threading.Thread(target=target) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual([], self.errors)
+
+    def test_single_instantiation(self):
+        num_instances = len(SlowProvider.instances)
+        results = []
+        def get():
+            results.append(self.injector.get('slow_dependent'))
+            results.append(self.injector.get('slow'))
+        self.run_threads(get)
+        self.assertEqual(num_instances + 1, len(SlowProvider.instances))
+        self.assertEqual(16, len(results))
+        self.assertEqual(1, len(set(id(result) for result in results)))
+        self.assertEqual(['slow', 'slow_dependent'],
+                         list(self.injector.get_order))
+
+    def test_concurrent_generator_send(self):
+        self.run_threads(lambda: self.injector.get('counter:1'))
+        self.assertEqual(9, self.injector.get('counter:1'))
+
+    def test_per_thread_cycle_tracking(self):
+        self.run_threads(lambda: self.injector.apply(slow_dependent))
+        self.injector.close()
+
+
+class AppInjector(jeni.Injector):
+    pass
+
+
+@AppInjector.provider('pool')
+class PoolProvider(jeni.Provider):
+    instances = []
+
+    def __init__(self):
+        self.thing = CloseMe('pool')
+        self.thing.open()
+        self.instances.append(self)
+
+    def get(self, name=None):
+        return self.thing
+
+    def close(self):
+        self.thing.close()
+
+
+class RequestInjector(AppInjector):
+    pass
+
+
+@RequestInjector.provider('session')
+@jeni.annotate('pool')
+def session(pool):
+    thing = CloseMe('session')
+    thing.open()
+    yield thing, pool
+    thing.close()
+
+
+class ScopedInjectorTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = AppInjector()
+
+    def test_scoped_notes(self):
+        self.assertEqual(
+            frozenset(['session']), RequestInjector.scoped_notes(AppInjector))
+        self.assertEqual(frozenset(), AppInjector.scoped_notes(AppInjector))
+
+    def test_children_share_parent_providers(self):
+        num_instances = len(PoolProvider.instances)
+        with self.app.child(RequestInjector) as one:
+            session_one, pool_one = one.get('session')
+        with self.app.child(RequestInjector) as two:
+            session_two, pool_two = two.get('session')
+        self.assertIs(pool_one, pool_two)
+        self.assertIsNot(session_one, session_two)
+        self.assertEqual(num_instances + 1, len(PoolProvider.instances))
+        self.assertEqual(['pool'], list(self.app.get_order))
+
+    def test_close_child_only(self):
+        child = self.app.child(RequestInjector)
+        session, pool = child.get('session')
+        child.close()
+        self.assertTrue(session.closed)
+        self.assertFalse(pool.closed)
+        self.app.close()
+        self.assertTrue(pool.closed)
+
+    def test_child_of_same_class(self):
+        child = self.app.child()
+        self.assertIsInstance(child, AppInjector)
+        self.assertIs(self.app.get('pool'), child.get('pool'))
+        self.assertEqual({}, child.instances)
+
+    def test_child_of_unrelated_class(self):
+        child = self.app.child(BasicInjector)
+        self.assertEqual('eggs!', child.get('eggs'))
+        self.assertIs(self.app.get('pool'), child.get('pool'))
+        self.assertRaises(LookupError, child.get, 'nothing')
+
+
+class RecordingHook(jeni.Hook):
+    def __init__(self):
+        self.events = []
+
+    def on_resolve_start(self, injector, note):
+        self.events.append(('start', note.note))
+
+    def on_resolve_end(self, injector, note, kind, cached, seconds, error):
+        self.events.append(('end', note.note, kind, cached, type(error)))
+
+    def on_instantiate(self, injector, note, kind, seconds):
+        self.events.append(('instantiate', note.note, kind))
+
+    def on_close(self, injector, basenote, kind, seconds):
+        self.events.append(('close', basenote, kind))
+
+
+class HookTestCase(unittest.TestCase):
+    def setUp(self):
+        self.hook = RecordingHook()
+        self.injector = BasicInjector(hooks=[self.hook])
+
+    def test_events(self):
+        self.injector.get('hello')
+        self.injector.get('hello')
+        self.injector.get('answer')
+        self.injector.close()
+        none = type(None)
+        self.assertEqual([
+            ('start', 'hello'),
+            ('instantiate', 'hello', jeni.CLASS),
+            ('end', 'hello', jeni.CLASS, False, none),
+            ('start', 'hello'),
+            ('end', 'hello', jeni.CLASS, True, none),
+            ('start', 'answer'),
+            ('instantiate', 'answer', jeni.GENERATOR),
+            ('end', 'answer', jeni.GENERATOR, False, none),
+            ('close', 'answer', jeni.GENERATOR),
+            ('close', 'hello', jeni.CLASS),
+        ], self.hook.events)
+
+    def test_factory_and_error(self):
+        self.injector.get('eggs')
+        self.assertRaises(LookupError, self.injector.get, 'nothing')
+        self.assertEqual([
+            ('start', 'eggs'),
+            ('end', 'eggs', jeni.FACTORY, False, type(None)),
+            ('start', 'nothing'),
+            ('end', 'nothing', None, False, LookupError),
+        ], self.hook.events)
+
+    def test_apply(self):
+        @jeni.annotate('eggs')
+        def fn(eggs):
+            return eggs
+        self.injector.apply(fn)
+        self.assertEqual(
+            [('start', 'eggs'), ('end', 'eggs', jeni.FACTORY, False,
+                                 type(None))],
+            self.hook.events)
+
+    def test_class_hook(self):
+        class Injector(BasicInjector):
+            pass
+
+        hook = Injector.hook(RecordingHook())
+        self.assertEqual((hook,), Injector.class_hooks())
+        self.assertEqual((), BasicInjector.class_hooks())
+        injector = Injector(hooks=[self.hook])
+        self.assertEqual((hook, self.hook), injector.hooks)
+        injector.get('eggs')
+        self.assertEqual(2, len(hook.events))
+        self.assertEqual(hook.events, self.hook.events)
+
+    def test_add_hook(self):
+        injector = BasicInjector()
+        self.assertEqual((), injector.hooks)
+        self.assertNotIn('get', vars(injector))
+        injector.add_hook(self.hook)
+        injector.get('eggs')
+        self.assertEqual(2, len(self.hook.events))
+
+    def test_no_reference_cycle(self):
+        injector = BasicInjector(hooks=[self.hook], timings=True)
+        injector.apply(hello_eggs)
+        ref = weakref.ref(injector)
+        gc.disable()
+        try:
+            del injector
+            self.assertIs(None, ref())
+        finally:
+            gc.enable()
+
+
+class BulkInjector(BasicInjector):
+    pass
+
+
+@BulkInjector.provider('kv')
+class KeyValueProvider(jeni.Provider):
+    def __init__(self):
+        self.requests = []
+        self.store = {'a': 1, 'b': 2, 'c': 3}
+
+    def get(self, name=None):
+        self.requests.append((name,))
+        return self.store[name]
+
+    def get_many(self, names):
+        self.requests.append(names)
+        return [self.store[name] for name in names]
+
+
+class GetManyTestCase(unittest.TestCase):
+    def setUp(self):
+        self.injector = BulkInjector()
+
+    def test_get_many(self):
+        self.assertEqual(
+            [1, 2, 1, 'eggs!', 3],
+            self.injector.get_many(['kv:a', 'kv:b', 'kv:a', 'eggs', 'kv:c']))
+        self.assertEqual(
+            [('a', 'b', 'c')], self.injector.instances['kv'].requests)
+
+    def test_single_name(self):
+        self.assertEqual([1], self.injector.get_many(['kv:a']))
+        self.assertEqual([('a',)], self.injector.instances['kv'].requests)
+
+    def test_apply(self):
+        @jeni.annotate('kv:a', 'kv:b', c='kv:c', d=jeni.maybe('kv:d'))
+        def fn(a, b, c, d=None):
+            return a, b, c, d
+        self.injector.get('kv:a')
+        self.assertEqual((1, 2, 3, None), self.injector.apply(fn))
+        requests = self.injector.instances['kv'].requests
+        self.assertEqual([('a',), ('a', 'b', 'c'), ('d',)], requests)
+
+    def test_fallback(self):
+        self.assertEqual(
+            ['spam', 'spamspam', 'x', 'y', 'Hello, x!', 'Hello, y!'],
+            self.injector.get_many(['spam:1', 'spam:2', 'echo:x', 'echo:y',
+                                    'hello:x', 'hello:y']))
+
+    def test_unset(self):
+        class Injector(jeni.Injector):
+            pass
+
+        @Injector.provider('unset')
+        class UnsetProvider(jeni.Provider):
+            def get(self, name=None):
+                "unused"
+
+            def get_many(self, names):
+                raise jeni.UnsetError()
+
+        with self.assertRaises(jeni.UnsetError) as raises:
+            Injector().get_many(['unset:a', 'unset:b'])
+        self.assertEqual("'unset:a'", str(raises.exception))
+
+    def test_child(self):
+        child = self.injector.child(RequestInjector)
+        self.assertEqual([1, 2], child.get_many(['kv:a', 'kv:b']))
+        self.assertEqual(
+            [('a', 'b')], self.injector.instances['kv'].requests)
+
+    def test_hooks(self):
+        hook = RecordingHook()
+        self.injector.add_hook(hook)
+        self.injector.get_many(['kv:a', 'kv:b'])
+        self.assertEqual([
+            ('start', 'kv:a'),
+            ('start', 'kv:b'),
+            ('instantiate', 'kv:a', jeni.CLASS),
+            ('end', 'kv:a', jeni.CLASS, False, type(None)),
+            ('end', 'kv:b', jeni.CLASS, False, type(None)),
+        ], hook.events)
+
+
+class CacheTestCase(unittest.TestCase):
+    def setUp(self):
+        class Injector(jeni.Injector):
+            pass
+
+        self.calls = calls = []
+
+        @Injector.factory('user', cache=jeni.LRU(2))
+        def user(name=None):
+            calls.append(name)
+            return {'name': name}
+
+        @Injector.provider('kv', cache=jeni.LRU())
+        class Provider(KeyValueProvider):
+            pass
+
+        self.Injector = Injector
+        self.injector = Injector()
+
+    def test_hit(self):
+        one = self.injector.get('user:one')
+        self.assertIs(one, self.injector.get('user:one'))
+        self.assertEqual(['one'], self.calls)
+        # The cache is created on the first miss, so counts the second get.
+        cache = self.injector.named_caches['user']
+        self.assertEqual((1, 0), (cache.hits, cache.misses))
+
+    def test_apply(self):
+        @jeni.annotate('user:one')
+        def fn(user):
+            return user
+        self.assertIs(self.injector.apply(fn), self.injector.apply(fn))
+        self.assertEqual(['one'], self.calls)
+
+    def test_eviction(self):
+        for name in ['one', 'two', 'one', 'three', 'one', 'two']:
+            self.injector.get('user:' + name)
+        self.assertEqual(['one', 'two', 'three', 'two'], self.calls)
+
+    def test_ttl(self):
+        cache = jeni.LRU(ttl=0.01)
+        cache.set('one', 1)
+        self.assertIn('one', cache)
+        self.assertEqual(1, cache.get('one'))
+        time.sleep(0.02)
+        self.assertNotIn('one', cache)
+        self.assertIs(None, cache.get('one'))
+        self.assertEqual((1, 1), (cache.hits, cache.misses))
+        self.assertEqual(0, len(cache))
+
+    def test_invalidate(self):
+        self.injector.get('user:one')
+        self.injector.get('user:two')
+        self.injector.invalidate('user:one')
+        self.injector.get('user:one')
+        self.injector.get('user:two')
+        self.injector.invalidate('user')
+        self.injector.get('user:two')
+        self.assertEqual(['one', 'two', 'one', 'two'], self.calls)
+        self.assertRaises(LookupError, self.injector.invalidate, 'eggs')
+
+    def test_per_injector(self):
+        self.injector.get('user:one')
+        self.Injector().get('user:one')
+        self.assertEqual(['one', 'one'], self.calls)
+        self.injector.reset()
+        self.assertEqual(0, len(self.injector.named_caches['user']))
+
+    def test_created_on_first_use(self):
+        self.assertEqual({}, dict(self.injector.named_caches))
+        self.injector.invalidate('user')
+        self.injector.get('user:one')
+        self.assertEqual(['user'], list(self.injector.named_caches))
+
+        class RequestInjector(self.Injector):
+            pass
+        RequestInjector.factory('session', lambda name=None: name)
+        RequestInjector.factory('local', lambda name=None: name,
+                                cache=jeni.LRU())
+        child = self.injector.child(RequestInjector)
+        self.assertIs(self.injector.get('user:one'), child.get('user:one'))
+        child.get('local:one')
+        self.assertEqual(['local'], list(child.named_caches))
+
+    def test_get_many(self):
+        self.injector.get('kv:a')
+        self.assertEqual([1, 2, 3], self.injector.get_many(
+            ['kv:a', 'kv:b', 'kv:c']))
+        self.assertEqual([1, 2], self.injector.get_many(['kv:a', 'kv:b']))
+        requests = self.injector.instances['kv'].requests
+        self.assertEqual([('a',), ('b', 'c')], requests)
+
+    def test_override_without_cache(self):
+        class Injector(self.Injector):
+            pass
+        Injector.factory('user', lambda name=None: name)
+        self.assertEqual(['kv'], list(Injector.caches()))
+        self.assertEqual(['kv', 'user'], sorted(self.Injector.caches()))
+
+
+class LifetimeTestCase(unittest.TestCase):
+    def setUp(self):
+        class Injector(jeni.Injector):
+            pass
+
+        self.calls = calls = collections.defaultdict(int)
+        self.closed = closed = []
+
+        class CountingProvider(jeni.Provider):
+            def get(self, name=None):
+                calls[type(self).__name__] += 1
+                return [name]
+
+            def close(self):
+                closed.append(type(self).__name__)
+
+        @Injector.factory('buffer', lifetime='transient')
+        def buffer():
+            calls['buffer'] += 1
+            return bytearray(8)
+
+        @Injector.provider('transient', lifetime=jeni.TRANSIENT)
+        class TransientProvider(CountingProvider):
+            pass
+
+        @Injector.provider('singleton', lifetime=jeni.SINGLETON)
+        class SingletonProvider(CountingProvider):
+            pass
+
+        @Injector.provider('pool', lifetime='singleton')
+        def pool():
+            calls['pool'] += 1
+            yield 'pool'
+            closed.append('pool')
+
+        @Injector.factory('config', lifetime='singleton')
+        def config():
+            calls['config'] += 1
+            return {}
+
+        @Injector.provider('lookup', lifetime='per_name')
+        class LookupProvider(CountingProvider):
+            pass
+
+        self.Injector = Injector
+
+    def tearDown(self):
+        self.Injector.close_singletons()
+
+    def test_transient(self):
+        injector = self.Injector()
+        self.assertIsNot(injector.get('buffer'), injector.get('buffer'))
+        self.assertEqual(2, self.calls['buffer'])
+        self.assertIsNot(injector.get('transient'), injector.get('transient'))
+        self.assertEqual(2, self.calls['TransientProvider'])
+        self.assertNotIn('buffer', injector.values)
+        self.assertNotIn('transient', injector.values)
+        injector.close()
+        self.assertEqual(['TransientProvider'], self.closed)
+
+    def test_transient_in_parent(self):
+        parent = self.Injector()
+        child = parent.child(type('Child', (self.Injector,), {}))
+        child.get('buffer')
+        child.get('buffer')
+        self.assertEqual(2, self.calls['buffer'])
+
+    def test_singleton(self):
+        one, two = self.Injector(), self.Injector()
+        for note, name in (('singleton', 'SingletonProvider'),
+                           ('pool', 'pool'), ('config', 'config')):
+            self.assertIs(one.get(note), two.get(note))
+            self.assertEqual(1, self.calls[name])
+        self.assertEqual(['name'], two.get('singleton:name'))
+        self.assertNotIn('singleton', one.instances)
+        config = one.get('config')
+        one.close()
+        two.close()
+        self.assertEqual([], self.closed)
+        self.Injector.close_singletons()
+        self.assertEqual(['SingletonProvider', 'pool'], sorted(self.closed))
+        self.assertIsNot(config, self.Injector().get('config'))
+        self.assertEqual(2, self.calls['config'])
+
+    def test_singleton_shared_by_subclasses(self):
+        class One(self.Injector):
+            pass
+
+        class Two(One):
+            pass
+        pool = self.Injector().get('pool')
+        self.assertIs(pool, One().get('pool'))
+        self.assertIs(pool, Two().get('pool'))
+        self.assertEqual(1, self.calls['pool'])
+
+        @Two.provider('singleton', lifetime='singleton')
+        class Override(self.Injector.lookup('singleton')):
+            pass
+        self.assertIsNot(Two().get('singleton'), One().get('singleton'))
+        self.Injector.close_singletons()
+        self.assertEqual(
+            ['Override', 'SingletonProvider', 'pool'], sorted(self.closed))
+
+    def test_singleton_captive_dependency(self):
+        @self.Injector.provider('conn')
+        def conn():
+            yield {'open': True}
+
+        @self.Injector.factory('session')
+        @jeni.annotate('conn')
+        def session(conn):
+            return conn
+
+        @self.Injector.factory('repository', lifetime='singleton')
+        @jeni.annotate('config', 'session')
+        def repository(config, session):
+            "unused"
+        graph = self.Injector.graph()
+        self.assertEqual([('repository', 'conn')], graph.captive)
+        self.assertFalse(graph.valid)
+        self.assertRaises(ValueError, self.Injector.validate)
+        self.assertRaises(ValueError, self.Injector().get, 'repository')
+
+    def test_singleton_registration_changes(self):
+        config = self.Injector().get('config')
+        self.Injector.factory('config', lambda: 'new', lifetime='singleton')
+        self.assertEqual('new', self.Injector().get('config'))
+        self.assertIsNot(config, self.Injector().get('config'))
+
+    def test_per_name(self):
+        injector = self.Injector()
+        self.assertIs(injector.get('lookup:a'), injector.get('lookup:a'))
+        injector.get('lookup:b')
+        self.assertEqual(2, self.calls['LookupProvider'])
+
+    def test_invalid(self):
+        self.assertRaises(
+            ValueError, self.Injector.factory, 'x', eggs, lifetime='forever')
+
+        def generator():
+            yield
+        self.assertRaises(
+            ValueError, self.Injector.provider, 'x', generator,
+            lifetime='transient')
+
+
+class ConcurrentCloseTestCase(unittest.TestCase):
+    def setUp(self):
+        class Injector(jeni.Injector):
+            pass
+
+        self.closed = closed = []
+        self.release = release = threading.Event()
+
+        def closer(note, seconds=0, error=None, deps=()):
+            class CloseProvider(jeni.Provider):
+                def __init__(self, *deps):
+                    "unused"
+
+                def get(self, name=None):
+                    return note
+
+                def close(self):
+                    if seconds is None:
+                        release.wait()
+                    time.sleep(seconds or 0)
+                    closed.append(note)
+                    if error is not None:
+                        raise error
+            if deps:
+                jeni.annotate(*deps)(CloseProvider.__init__)
+            Injector.provider(note, CloseProvider)
+
+        for n in range(3):
+            closer('slow{}'.format(n), seconds=0.1)
+        closer('base')
+        closer('db', seconds=0.05, deps=['base'])
+        closer('fail', error=ValueError('fail'))
+        closer('hang', seconds=None, deps=['base'])
+
+        @Injector.factory('via_factory')
+        @jeni.annotate('db')
+        def via_factory(db):
+            return db
+
+        closer('top', deps=['via_factory'])
+        self.injector = Injector()
+
+    def tearDown(self):
+        self.release.set()
+
+    def test_concurrent(self):
+        self.injector.get_many(['slow0', 'slow1', 'slow2'])
+        start = time.time()
+        self.injector.close(max_workers=4)
+        self.assertTrue(time.time() - start < 0.25)
+        self.assertTrue(self.injector.closed)
+        self.assertEqual(3, len(self.closed))
+
+    def test_dependents_first(self):
+        self.injector.get('base')
+        self.injector.get('top')
+        self.injector.get('slow0')
+        self.injector.close(max_workers=4)
+        self.assertEqual(4, len(self.closed))
+        self.assertLess(self.closed.index('top'), self.closed.index('db'))
+        self.assertLess(self.closed.index('db'), self.closed.index('base'))
+
+    def test_errors(self):
+        self.injector.get_many(['fail', 'db'])
+        with self.assertRaises(jeni.CloseError) as raises:
+            self.injector.close(max_workers=2)
+        self.assertEqual(['fail'], list(raises.exception.errors))
+        self.assertEqual(['base', 'db', 'fail'], sorted(self.closed))
+        self.assertTrue(self.injector.closed)
+
+    def test_timeout(self):
+        self.injector.get('hang')
+        with self.assertRaises(jeni.CloseError) as raises:
+            self.injector.close(timeout=0.05)
+        error = raises.exception.errors['hang']
+        self.assertIsInstance(error, jeni.CloseTimeoutError)
+        self.assertEqual(['base'], self.closed)
+
+
+class PoolInjector(jeni.Injector):
+    def __init__(self, log=None, **kw):
+        super(PoolInjector, self).__init__(**kw)
+        self.log = log
+
+    def close(self):
+        super(PoolInjector, self).close()
+        if self.log is not None:
+            with open(self.log, 'a') as fd:
+                fd.write('{}\n'.format(os.getpid()))
+
+
+PoolInjector.value('offset', 10)
+
+
+@jeni.annotate('offset')
+def add_offset(offset, item):
+    if item is None:
+        raise ValueError('no item')
+    return offset + item
+
+
+class ProcessPoolTestCase(unittest.TestCase):
+    def test_map(self):
+        self.assertEqual(
+            list(range(10, 30)),
+            PoolInjector.map(add_offset, range(20), processes=2, chunksize=3))
+
+    def test_imap_unordered(self):
+        results = PoolInjector.imap_unordered(
+            add_offset, range(20), processes=2, chunksize=3)
+        self.assertEqual(list(range(10, 30)), sorted(results))
+
+    def test_error(self):
+        items = [1, 2, None, 4]
+        self.assertRaises(
+            ValueError, PoolInjector.map, add_offset, items, processes=2)
+        results = PoolInjector.imap_unordered(add_offset, items, processes=2)
+        self.assertRaises(ValueError, list, results)
+
+    def test_not_registered(self):
+        @jeni.annotate('nothing')
+        def fn(nothing, item):
+            "unused"
+        self.assertRaises(LookupError, jeni.Injector.map, fn, [1], processes=1)
+
+    def test_backlog(self):
+        consumed = [0]
+
+        def items():
+            for n in range(100):
+                consumed[0] += 1
+                yield n
+        results = PoolInjector.imap(
+            add_offset, items(), processes=2, chunksize=1, backlog=2)
+        self.assertEqual(10, next(results))
+        self.assertTrue(consumed[0] <= 5)
+        self.assertEqual(list(range(11, 110)), list(results))
+
+    def test_close(self):
+        fd, log = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            PoolInjector.map(add_offset, range(20), processes=2, log=log)
+            with open(log) as fd:
+                pids = fd.read().split()
+            self.assertEqual(2, len(pids))
+            self.assertNotIn(str(os.getpid()), pids)
+        finally:
+            os.remove(log)
+
+
+class CompileTestCase(unittest.TestCase):
+    def setUp(self):
+        class Injector(BulkInjector):
+            pass
+        self.Injector = Injector
+        self.injector = Injector()
+
+        @jeni.annotate('hello', 'hello:x', jeni.partial(hello_partial),
+                       maybe=jeni.maybe('nothing'), eggs='eggs')
+        def fn(hello, hello_x, partial_fn, *a, **kw):
+            return hello, hello_x, partial_fn(), a, kw
+        self.fn = fn
+
+    def test_apply(self):
+        compiled = self.injector.compile(self.fn)
+        expected = BulkInjector().apply(self.fn, 'a', eggs='EGGS', x=1)
+        self.assertEqual(expected, compiled('a', eggs='EGGS', x=1))
+        self.assertEqual(expected, compiled('a', eggs='EGGS', x=1))
+        self.assertEqual(2, self.injector.stats['hello'])
+        self.assertEqual(2, self.injector.stats['nothing'])
+        self.assertIs(compiled, self.injector.compile(self.fn))
+
+    def test_source(self):
+        compiled = self.injector.compile(self.fn)
+        self.assertIn('def apply_fn(*a, **kw):', compiled.__source__)
+        self.assertEqual(
+            compiled.__source__, inspect.getsource(compiled.__code__))
+        self.assertIs(self.fn, compiled.__wrapped__)
+
+    def test_registry_change(self):
+        compiled = self.injector.compile(self.fn)
+        self.assertEqual('eggs!', compiled()[4]['eggs'])
+        self.Injector.value('eggs', 'EGGS')
+        self.injector.values.clear()
+        self.assertEqual('EGGS', compiled()[4]['eggs'])
+        self.assertIsNot(compiled, self.injector.compile(self.fn))
+
+    def test_hooks(self):
+        compiled = self.injector.compile(self.fn)
+        hook = RecordingHook()
+        self.injector.add_hook(hook)
+        compiled()
+        self.assertIn(('start', 'hello'), hook.events)
+
+    def test_closed(self):
+        compiled = self.injector.compile(self.fn)
+        self.injector.close()
+        self.assertRaises(RuntimeError, compiled)
+
+    def test_not_registered(self):
+        @jeni.annotate('nothing')
+        def fn(nothing):
+            "unused"
+        self.assertRaises(LookupError, self.injector.compile(fn))
+
+    def test_bound_methods(self):
+        class Handler(object):
+            def __init__(self, n):
+                self.n = n
+
+            @jeni.annotate('eggs')
+            def eat(self, eggs):
+                return self.n, eggs
+        one, two = Handler(1), Handler(2)
+        self.assertEqual((1, 'eggs!'), self.injector.compile(one.eat)())
+        self.assertEqual((2, 'eggs!'), self.injector.compile(two.eat)())
+        self.assertIs(
+            self.injector.compile(one.eat), self.injector.compile(one.eat))
+
+    def test_bulk(self):
+        @jeni.annotate('kv:a', 'kv:b')
+        def fn(a, b):
+            return a, b
+        self.assertEqual((1, 2), self.injector.compile(fn)())
+        self.assertEqual(
+            [('a', 'b')], self.injector.instances['kv'].requests)
+
+
+class TimingsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.injector = BasicInjector(timings=True)
+        self.timings = self.injector.timings
+
+    def test_disabled(self):
+        injector = BasicInjector()
+        self.assertIs(None, injector.timings)
+        self.assertNotIn('get', vars(injector))
+        self.assertNotIn('get_step', vars(injector))
+
+    def test_get(self):
+        self.injector.get('hello')
+        self.injector.get('hello')
+        self.injector.get('hello:x')
+        miss = self.timings.histogram('hello', jeni.GET)
+        hit = self.timings.histogram('hello', jeni.GET, hit=True)
+        named = self.timings.histogram('hello', jeni.GET_NAME)
+        self.assertEqual((1, 1, 1), (miss.count, hit.count, named.count))
+        self.assertEqual(
+            1, self.timings.histogram('hello', jeni.INSTANTIATE).count)
+
+    def test_generator_init(self):
+        self.injector.get('answer')
+        self.assertEqual(1, self.timings.histogram('answer', jeni.INIT).count)
+
+    def test_apply(self):
+        @jeni.annotate('eggs', 'spam:2')
+        def fn(eggs, spam):
+            return eggs, spam
+        self.injector.apply(fn)
+        self.injector.apply(fn)
+        self.assertEqual(1, self.timings.histogram('eggs').count)
+        self.assertEqual(1, self.timings.histogram('eggs', hit=True).count)
+        self.assertEqual(
+            2, self.timings.histogram('spam', jeni.GET_NAME).count)
+
+    def test_summary(self):
+        self.injector.get('eggs')
+        self.injector.get('eggs')
+        summary = self.timings.summary()
+        self.assertEqual(['get', 'get:hit'], sorted(summary['eggs']))
+        self.assertEqual(1, summary['eggs']['get']['count'])
+
+    def test_shared_timings(self):
+        other = BasicInjector(timings=self.timings)
+        self.injector.get('eggs')
+        other.get('eggs')
+        self.assertEqual(2, self.timings.histogram('eggs').count)
+
+
+class HistogramTestCase(unittest.TestCase):
+    def test_empty(self):
+        histogram = jeni.Histogram()
+        self.assertIs(None, histogram.quantile(0.5))
+        self.assertEqual(0, histogram.as_dict()['count'])
+
+    def test_quantiles(self):
+        histogram = jeni.Histogram()
+        for n in range(1, 101):
+            histogram.add(n / 1000.0)
+        self.assertEqual(100, histogram.count)
+        self.assertAlmostEqual(5.05, histogram.sum)
+        self.assertEqual((0.001, 0.1), (histogram.min, histogram.max))
+        self.assertTrue(0.05 <= histogram.quantile(0.5) <= 0.1)
+        self.assertEqual(0.1, histogram.quantile(1))
+        self.assertEqual(0.001, histogram.quantile(0))
+        self.assertEqual(
+            100, sum(count for _, count in histogram.as_dict()['buckets']))
+
+
 class ContextManagerTestCase(unittest.TestCase):
     def test_with_block(self):
         with CloseTestInjector() as injector:
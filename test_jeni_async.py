@@ -0,0 +1,325 @@
+import asyncio
+import time
+import unittest
+
+import jeni
+import jeni_async
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+class AsyncInjector(jeni_async.AsyncInjector):
+    pass
+
+
+@AsyncInjector.factory('eggs')
+async def eggs():
+    await asyncio.sleep(0)
+    return 'eggs!'
+
+
+@AsyncInjector.factory('echo')
+def echo(name=None):
+    return name
+
+
+@AsyncInjector.provider('spam', name=True)
+async def spam():
+    count_str = yield 'spam'
+    while True:
+        count_str = yield 'spam' * int(count_str)
+
+
+@AsyncInjector.provider('answer')
+def answer():
+    yield 42
+
+
+class Closeable(object):
+    def __init__(self):
+        self.closed = False
+
+
+@AsyncInjector.provider('resource')
+class ResourceProvider(jeni.Provider):
+    instances = []
+
+    def __init__(self):
+        self.resource = Closeable()
+        self.instances.append(self)
+
+    async def get(self, name=None):
+        await asyncio.sleep(0.01)
+        return self.resource
+
+    async def aclose(self):
+        await asyncio.sleep(0)
+        self.resource.closed = True
+
+
+for n in range(5):
+    @AsyncInjector.factory('slow{}'.format(n))
+    async def slow(n=n):
+        await asyncio.sleep(0.1)
+        return n
+
+
+@jeni.annotate('slow0', 'slow1', 'slow2', slow3='slow3', slow4='slow4')
+async def slow_handler(slow0, slow1, slow2, slow3, slow4):
+    return slow0 + slow1 + slow2 + slow3 + slow4
+
+
+@jeni.annotate('resource', 'resource', nothing=jeni.maybe('nothing'))
+def sync_handler(one, two, nothing=None):
+    return one, two, nothing
+
+
+class AsyncInjectorTestCase(unittest.TestCase):
+    def setUp(self):
+        self.injector = AsyncInjector()
+
+    def test_async_factory(self):
+        self.assertEqual('eggs!', run(self.injector.aget('eggs')))
+        self.assertEqual('foo', run(self.injector.aget('echo:foo')))
+
+    def test_async_generator(self):
+        async def test():
+            self.assertEqual('spam', await self.injector.aget('spam'))
+            self.assertEqual('spamspam', await self.injector.aget('spam:2'))
+            self.assertEqual(42, await self.injector.aget('answer'))
+            await self.injector.aclose()
+        run(test())
+
+    def test_async_provider_class(self):
+        async def test():
+            async with AsyncInjector() as injector:
+                resource = await injector.aget('resource')
+                self.assertFalse(resource.closed)
+            return resource
+        self.assertTrue(run(test()).closed)
+
+    def test_concurrent_resolution(self):
+        start = time.time()
+        self.assertEqual(10, run(self.injector.aapply(slow_handler)))
+        self.assertTrue(time.time() - start < 0.3)
+
+    def test_single_instantiation(self):
+        num_instances = len(ResourceProvider.instances)
+        one, two, nothing = run(self.injector.aapply(sync_handler))
+        self.assertIs(one, two)
+        self.assertIs(None, nothing)
+        self.assertEqual(num_instances + 1, len(ResourceProvider.instances))
+
+    def test_apartial(self):
+        async def test():
+            fn = self.injector.apartial(slow_handler)
+            self.assertEqual(0, self.injector.stats['slow0'])
+            self.assertEqual(10, await fn())
+            self.assertEqual(10, await fn())
+            self.assertEqual(1, self.injector.stats['slow0'])
+        run(test())
+
+    def test_aiapply(self):
+        @jeni.annotate('eggs')
+        async def fn(eggs, item):
+            return eggs, item
+
+        async def items():
+            for n in range(3):
+                yield n
+
+        async def test(iterable, batch=None):
+            return [r async for r in self.injector.aiapply(
+                fn, iterable, batch=batch)]
+        expected = [('eggs!', n) for n in range(3)]
+        self.assertEqual(expected, run(test(items())))
+        self.assertEqual(1, self.injector.stats['eggs'])
+        self.assertEqual(expected, run(test(range(3))))
+        self.assertEqual(
+            [('eggs!', [0, 1]), ('eggs!', [2])], run(test(range(3), batch=2)))
+
+    def test_aiapply_stop_early(self):
+        closed = []
+
+        def items():
+            try:
+                yield from range(10)
+            finally:
+                closed.append(True)
+
+        @jeni.annotate('eggs')
+        def fn(eggs, item):
+            return item
+
+        async def test():
+            results = self.injector.aiapply(fn, items())
+            self.assertEqual(0, await results.__anext__())
+            await results.aclose()
+        run(test())
+        self.assertEqual([True], closed)
+
+    def test_transient(self):
+        class Injector(AsyncInjector):
+            pass
+
+        @Injector.factory('buffer', lifetime='transient')
+        async def buffer():
+            return bytearray(8)
+
+        @Injector.provider('transient', lifetime='transient')
+        class TransientProvider(jeni.Provider):
+            async def get(self, name=None):
+                return bytearray(8)
+
+        async def test():
+            injector = Injector()
+            for note in ('buffer', 'transient'):
+                self.assertIsNot(
+                    await injector.aget(note), await injector.aget(note))
+                self.assertNotIn(note, injector.values)
+            child = injector.child(type('Child', (Injector,), {}))
+            self.assertIsNot(
+                await child.aget('buffer'), await child.aget('buffer'))
+        run(test())
+
+    def test_singleton_unsupported(self):
+        class Injector(AsyncInjector):
+            pass
+        self.assertRaises(
+            ValueError, Injector.factory, 'config', eggs,
+            lifetime='singleton')
+        self.assertRaises(
+            ValueError, Injector.provider, 'resource', ResourceProvider,
+            lifetime='singleton')
+
+        class Base(jeni.Injector):
+            pass
+        Base.factory('config', lambda: {}, lifetime='singleton')
+
+        class Mixed(AsyncInjector, Base):
+            pass
+        self.assertRaises(ValueError, run, Mixed().aget('config'))
+
+    def test_named_cache(self):
+        class Injector(AsyncInjector):
+            pass
+        calls = []
+
+        @Injector.factory('user', lifetime='per_name')
+        async def user(name=None):
+            calls.append(name)
+            return {'name': name}
+
+        @jeni.annotate('user:one')
+        def fn(user):
+            return user
+
+        async def test():
+            injector = Injector()
+            one = await injector.aget('user:one')
+            self.assertIs(one, await injector.aget('user:one'))
+            self.assertIs(one, await injector.aapply(fn))
+        run(test())
+        self.assertEqual(['one'], calls)
+
+    def test_partial_note(self):
+        @jeni.annotate(jeni.partial(slow_handler),
+                       jeni.annotate.eager_partial_regardless(echo))
+        async def handler(fn, eager_echo):
+            return await fn(), eager_echo('x')
+        self.assertEqual((10, 'x'), run(self.injector.aapply(handler)))
+
+    def test_not_registered(self):
+        @jeni.annotate('eggs', 'nothing')
+        def fn(eggs, nothing):
+            "unused"
+        self.assertRaises(LookupError, run, self.injector.aapply(fn))
+
+    def test_cycle(self):
+        class Injector(AsyncInjector):
+            pass
+
+        @Injector.factory('one')
+        @jeni.annotate('two')
+        async def one(two):
+            "unused"
+
+        @Injector.factory('two')
+        @jeni.annotate('one')
+        async def two(one):
+            "unused"
+
+        with self.assertRaises(jeni.DependencyCycleError) as raises:
+            run(Injector().aget('one'))
+        self.assertEqual(
+            (('one', None), ('two', None), ('one', None)),
+            raises.exception.notes)
+
+    def test_unset(self):
+        class Injector(AsyncInjector):
+            pass
+
+        @Injector.factory('unset')
+        async def unset():
+            raise jeni.UnsetError('not now')
+
+        with self.assertRaises(jeni.UnsetError) as raises:
+            run(Injector().aget('unset'))
+        self.assertEqual("not now: 'unset'", str(raises.exception))
+
+
+class RequestInjector(AsyncInjector):
+    pass
+
+
+@RequestInjector.provider('request')
+@jeni.annotate('resource')
+async def request(resource):
+    yield {'resource': resource}
+
+
+class AsyncScopedInjectorTestCase(unittest.TestCase):
+    def test_child(self):
+        async def test():
+            app = AsyncInjector()
+            async with app.child(RequestInjector) as one:
+                request_one = await one.aget('request')
+            async with app.child(RequestInjector) as two:
+                request_two = await two.aget('request')
+            self.assertIsNot(request_one, request_two)
+            self.assertIs(request_one['resource'], request_two['resource'])
+            self.assertFalse(request_one['resource'].closed)
+            await app.aclose()
+            self.assertTrue(request_one['resource'].closed)
+        run(test())
+
+    def test_areset(self):
+        async def test():
+            injector = AsyncInjector()
+            resource = await injector.aget('resource')
+            await injector.areset()
+            self.assertTrue(resource.closed)
+            self.assertEqual({}, injector.alocks)
+            self.assertIsNot(resource, await injector.aget('resource'))
+        run(test())
+
+
+class AsyncGeneratorProviderTestCase(unittest.TestCase):
+    def test_not_async_generator(self):
+        self.assertRaises(
+            TypeError, jeni_async.AsyncGeneratorProvider, answer)
+
+    def test_lifecycle(self):
+        async def fn():
+            yield 42
+        provider = jeni_async.AsyncGeneratorProvider(fn)
+        self.assertRaises(RuntimeError, run, provider.get())
+        self.assertEqual(42, run(provider.init()))
+        self.assertRaises(TypeError, run, provider.get(name='name'))
+        self.assertRaises(RuntimeError, provider.close)
+        run(provider.aclose())
+
+
+if __name__ == '__main__': unittest.main()